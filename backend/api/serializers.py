@@ -5,8 +5,15 @@
 from rest_framework import serializers
 
 # Локальные импорты
+from recipes.loaders import (
+    ViewerStateListSerializer, attach_recipe_previews, get_recipes_limit,
+    get_viewer_state,
+)
+from django.db import transaction
+
 from recipes.models import Ingredient, Recipe, RecipeIngredient, Favorite, ShoppingCart
-from users.models import Follow
+from recipes.serializers import save_recipe_ingredients
+from recipes.signals import collect_recipe_changes
 from users.serializers import CustomUserSerializer
 from core.fields import Base64ImageField
 
@@ -85,39 +92,25 @@ class RecipeSerializer(serializers.ModelSerializer):
         return None
 
     def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return Favorite.objects.filter(user=request.user, recipe=obj).exists()
-        return False
+        return get_viewer_state(self.context).is_favorited(obj)
 
     def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return ShoppingCart.objects.filter(user=request.user, recipe=obj).exists()
-        return False
+        return get_viewer_state(self.context).is_in_shopping_cart(obj)
 
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredients', [])
         tags_data = validated_data.pop('tags', [])
         image_data = validated_data.pop('image')
-    
-        recipe = Recipe.objects.create(
-            creator=self.context['request'].user,
-            image=image_data,
-            **validated_data
-        )
-    
-    
-        for ingredient in ingredients_data:
-            RecipeIngredient.objects.create(
-                recipe=recipe,
-                ingredient_id=ingredient['id'],
-                amount=ingredient['amount']
+
+        with transaction.atomic(), collect_recipe_changes():
+            recipe = Recipe.objects.create(
+                creator=self.context['request'].user,
+                image=image_data,
+                **validated_data
             )
-    
-    
-        recipe.tags.set(tags_data)
-    
+            save_recipe_ingredients(recipe, ingredients_data, created=True)
+            recipe.tags.set(tags_data)
+
         return recipe
     def update(self, instance, validated_data):
         ingredients_data = validated_data.pop('ingredients_data', None)
@@ -128,12 +121,11 @@ class RecipeSerializer(serializers.ModelSerializer):
         instance.title = validated_data.get('title', instance.title)
         instance.description = validated_data.get('description', instance.description)
         instance.cook_time = validated_data.get('cook_time', instance.cook_time)
-        instance.save()
 
-        if ingredients_data is not None:
-            instance.recipeingredient_set.all().delete()
-            for ingredient_data in ingredients_data:
-                RecipeIngredient.objects.create(recipe=instance, **ingredient_data)
+        with transaction.atomic(), collect_recipe_changes():
+            instance.save()
+            if ingredients_data is not None:
+                save_recipe_ingredients(instance, ingredients_data)
 
         return instance
 
@@ -164,23 +156,26 @@ class UserWithRecipesSerializer(serializers.ModelSerializer):
     class Meta:
         model = CustomUserSerializer.Meta.model
         fields = CustomUserSerializer.Meta.fields + ('is_subscribed', 'recipes', 'recipes_count')
+        list_serializer_class = ViewerStateListSerializer
+
+    def prime_viewer_state(self, state, users):
+        state.add_authors(user.pk for user in users)
+        attach_recipe_previews(
+            users, get_recipes_limit(self.context.get('request'))
+        )
 
     def get_recipes(self, obj):
         request = self.context.get('request')
-        recipes_limit = request.query_params.get('recipes_limit')
-        queryset = obj.recipes.all()
-        if recipes_limit:
-            try:
-                queryset = queryset[:int(recipes_limit)]
-            except ValueError:
-                pass 
+        queryset = getattr(obj, 'recipe_previews', None)
+        if queryset is None:
+            queryset = obj.recipes.all()
+            recipes_limit = get_recipes_limit(request)
+            if recipes_limit is not None:
+                queryset = queryset[:recipes_limit]
         return RecipeMinifiedSerializer(queryset, many=True, context={'request': request}).data
 
     def get_recipes_count(self, obj):
-        return obj.recipes.count()
+        return obj.recipes_count
         
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return Follow.objects.filter(follower=request.user, leader=obj).exists()
-        return False 
\ No newline at end of file
+        return get_viewer_state(self.context).is_subscribed(obj) 
\ No newline at end of file
@@ -1,6 +1,5 @@
 # Стандартные библиотеки
-from collections import defaultdict
-from django.http import HttpResponse
+# (отсутствуют)
 
 # Сторонние библиотеки
 from rest_framework import (
@@ -10,6 +9,7 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
 from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.renderers import JSONRenderer
 
 # Локальные импорты
 from recipes.models import Ingredient, Recipe, RecipeIngredient, Favorite, ShoppingCart
@@ -23,9 +23,13 @@ from recipes.permissions import IsAuthorOrReadOnly, IsOwnerOrReadOnly
 from users.models import CustomUser, Follow
 from users.serializers import (
     CustomUserSerializer, FollowSerializer,
-    ChangePasswordSerializer, AvatarSerializer
+    ChangePasswordSerializer, AvatarSerializer, subscribed_authors
 )
 from core.fields import Base64ImageField
+from recipes.ingredient_index import ingredient_index
+from recipes.shopping_list import (
+    available_formats, shopping_list_response
+)
 
 class RecipeLimitPagination(LimitOffsetPagination):
     default_limit = 10
@@ -37,12 +41,11 @@ class IngredientViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.AllowAny]
     http_method_names = ['get']
 
-    def get_queryset(self):
-        queryset = self.queryset
-        name = self.request.query_params.get('name', None)
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name', None)
         if name is not None:
-            queryset = queryset.filter(name__startswith=name)
-        return queryset
+            return Response(ingredient_index.search(name))
+        return Response(ingredient_index.all())
 
 
 
@@ -110,36 +113,24 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 return Response({'status': 'Рецепт удален из списка покупок'}, status=status.HTTP_204_NO_CONTENT)
             return Response({'status': 'Рецепт не найден в списке покупок'}, status=status.HTTP_400_BAD_REQUEST)
 
+    def perform_content_negotiation(self, request, force=False):
+        if self.action == 'download_shopping_cart':
+            renderer = JSONRenderer()
+            return renderer, renderer.media_type
+        return super().perform_content_negotiation(request, force)
+
     @action(detail=False, methods=['get'], url_path='download_shopping_cart', url_name='download_shopping_cart', permission_classes=[permissions.IsAuthenticated])
     def download_shopping_cart(self, request):
-        ingredients = defaultdict(lambda: [0, ''])
-        queryset = ShoppingCart.objects.filter(user=request.user).select_related(
-            'recipe'
-        ).prefetch_related(
-            'recipe__recipeingredient_set__ingredient'
-        ).values(
-            'recipe__recipeingredient__ingredient__name',
-            'recipe__recipeingredient__ingredient__measurement_unit',
-            'recipe__recipeingredient__quantity'
-        ).order_by('recipe__recipeingredient__ingredient__name')
-
-        for item in queryset:
-            name = item['recipe__recipeingredient__ingredient__name']
-            unit = item['recipe__recipeingredient__ingredient__measurement_unit']
-            quantity = item['recipe__recipeingredient__quantity']
-            ingredients[(name, unit)][0] += quantity
-            ingredients[(name, unit)][1] = unit
-
-        lines = [
-            f'{name} ({unit}) — {amount}'
-            for (name, unit), (amount, _) in ingredients.items()
-        ]
-        content = '\n'.join(lines)
-        response = HttpResponse(content, content_type='text/plain')
-        response['Content-Disposition'] = (
-            'attachment; filename="shopping_list.txt"'
+        export_format = request.query_params.get('format', 'txt')
+        formats = available_formats()
+        if export_format not in formats:
+            return Response(
+                {'status': f'Неподдерживаемый формат. Доступные: {", ".join(formats)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return shopping_list_response(
+            request.user, export_format
         )
-        return response
 
 class FollowViewSet(viewsets.ModelViewSet):
     
@@ -150,7 +141,7 @@ class FollowViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         
-        return CustomUser.objects.filter(following__follower=self.request.user)
+        return subscribed_authors(self.request.user)
 
 class CustomUserViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = CustomUser.objects.all()
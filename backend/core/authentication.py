@@ -0,0 +1,194 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import cache, caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+CACHE_PREFIX = 'auth-token'
+USER_CACHE_PREFIX = 'auth-user'
+SIGNED_TOKEN_SALT = 'core.authentication.signed-token'
+
+
+class TokenCache:
+    """
+    Кэш соответствия токен → (пользователь, токен).
+
+    Первый уровень — ограниченный LRU в памяти процесса с коротким TTL,
+    второй (необязательный) — кэш Django с алиасом TOKEN_CACHE_ALIAS,
+    общий для всех процессов. Инвалидация очищает оба уровня в текущем
+    процессе; в других процессах запись живет не дольше TTL.
+    """
+
+    def __init__(self, max_size, ttl, alias=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.alias = alias
+        self._entries = OrderedDict()
+        self._users = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cache_key(key):
+        # В общем кэше хранится хэш, а не сам токен.
+        return f'{CACHE_PREFIX}:{hashlib.sha256(key.encode()).hexdigest()}'
+
+    @property
+    def shared(self):
+        return caches[self.alias] if self.alias else None
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    return entry[1]
+                self._forget(key)
+        if self.shared is None:
+            return None
+        credentials = self.shared.get(self.cache_key(key))
+        if credentials is not None:
+            self._remember(key, credentials, now)
+        return credentials
+
+    def set(self, key, credentials):
+        self._remember(key, credentials, time.monotonic())
+        if self.shared is not None:
+            self.shared.set(self.cache_key(key), credentials, self.ttl)
+
+    def invalidate(self, keys):
+        keys = list(keys)
+        with self._lock:
+            for key in keys:
+                self._forget(key)
+        if self.shared is not None and keys:
+            self.shared.delete_many([self.cache_key(key) for key in keys])
+
+    def invalidate_user(self, user_id, keys=()):
+        """
+        Сбрасывает записи пользователя, известные процессу. Ключи keys
+        (например, ленивый QuerySet токенов) нужны только общему кэшу и
+        вычисляются, лишь когда он включен.
+        """
+        with self._lock:
+            known = set(self._users.get(user_id, ()))
+        if self.shared is not None:
+            known.update(keys)
+        self.invalidate(known)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._users.clear()
+
+    def _remember(self, key, credentials, now):
+        user_id = credentials[0].pk
+        with self._lock:
+            self._forget(key)
+            self._entries[key] = (now + self.ttl, credentials)
+            self._users.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._forget(next(iter(self._entries)))
+
+    def _forget(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        user_id = entry[1][0].pk
+        keys = self._users.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._users[user_id]
+
+
+token_cache = TokenCache(
+    max_size=settings.TOKEN_CACHE_SIZE,
+    ttl=settings.TOKEN_CACHE_TTL,
+    alias=settings.TOKEN_CACHE_ALIAS,
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication без запроса к базе при попадании в кэш.
+
+    Записи сбрасываются при удалении токена (выход), сохранении
+    пользователя (смена пароля, деактивация) и его удалении.
+    """
+
+    def authenticate_credentials(self, key):
+        credentials = token_cache.get(key)
+        if credentials is None:
+            credentials = super().authenticate_credentials(key)
+            token_cache.set(key, credentials)
+        user, token = credentials
+        # Копия: представления могут менять request.user.
+        return copy.copy(user), token
+
+
+def token_signer():
+    return signing.TimestampSigner(salt=SIGNED_TOKEN_SALT)
+
+
+def issue_signed_token(user):
+    """Подписанный токен доступа: id пользователя, версия токенов, время."""
+    return token_signer().sign(f'{user.pk}.{user.token_version}')
+
+
+def signed_user_key(user_id):
+    return f'{USER_CACHE_PREFIX}:{user_id}'
+
+
+def forget_signed_user(user_id):
+    cache.delete(signed_user_key(user_id))
+
+
+class SignedTokenAuthentication(CachedTokenAuthentication):
+    """
+    Проверка подписанных токенов без таблицы токенов.
+
+    Подпись и срок действия проверяются по SECRET_KEY. Версия токенов и
+    is_active читаются из базы при каждом запросе одним запросом по
+    первичному ключу на две колонки: увеличение версии отзывает все
+    выданные токены сразу во всех процессах, даже если кэш не общий.
+    Остальные поля пользователя берутся из кэша Django и могут отставать
+    от базы на TOKEN_CACHE_TTL секунд. Ключи из базы (без разделителя
+    подписи) проверяются как раньше.
+    """
+
+    def authenticate_credentials(self, key):
+        signer = token_signer()
+        if signer.sep not in key:
+            return super().authenticate_credentials(key)
+        try:
+            user_id, version = map(int, signer.unsign(
+                key, max_age=settings.SIGNED_TOKEN_MAX_AGE
+            ).split('.'))
+        except (signing.BadSignature, ValueError):
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        users = get_user_model().objects.filter(pk=user_id)
+        state = users.values_list('token_version', 'is_active').first()
+        if state is None or state[0] != version:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not state[1]:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        user = cache.get(signed_user_key(user_id))
+        if user is None:
+            user = users.first()
+            if user is None:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            cache.set(signed_user_key(user_id), user, settings.TOKEN_CACHE_TTL)
+        user.token_version, user.is_active = state
+        return user, None
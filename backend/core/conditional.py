@@ -0,0 +1,97 @@
+import hashlib
+import time
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def to_timestamp(*values):
+    """Максимум из datetime и timestamp-значений, None пропускаются."""
+    return max(
+        (
+            value.timestamp() if hasattr(value, 'timestamp') else value
+            for value in values if value is not None
+        ),
+        default=0,
+    )
+
+
+class ConditionalGetMixin:
+    """
+    Условные GET-запросы (ETag / Last-Modified) для list и retrieve.
+
+    Представление описывает валидаторы методами get_list_validators и
+    get_object_validators: они возвращают кортеж (части ETag, время
+    последнего изменения) по дешевым агрегатным запросам. При совпадении
+    валидаторов ответ 304 отдается без выборки и сериализации объектов.
+
+    Время может быть None: спискам удаление строки меняет только число
+    строк в ETag, а не максимум updated_at, поэтому они проверяются
+    только по ETag. Last-Modified с точностью до секунды не отдается и
+    для текущей секунды: следующее изменение в ту же секунду его бы не
+    сдвинуло.
+    """
+
+    def get_list_validators(self, queryset):
+        return None
+
+    def get_object_validators(self, queryset):
+        return None
+
+    def list(self, request, *args, **kwargs):
+        validators = self.get_list_validators(
+            self.filter_queryset(self.get_queryset())
+        )
+        return self.conditional_response(
+            request, validators,
+            lambda: super(ConditionalGetMixin, self).list(
+                request, *args, **kwargs
+            )
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        try:
+            queryset = self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: lookup}
+            )
+            validators = self.get_object_validators(queryset)
+        except (TypeError, ValueError):
+            validators = None
+        return self.conditional_response(
+            request, validators,
+            lambda: super(ConditionalGetMixin, self).retrieve(
+                request, *args, **kwargs
+            )
+        )
+
+    def conditional_response(self, request, validators, handler):
+        if validators is None or request.method not in ('GET', 'HEAD'):
+            return handler()
+        parts, last_modified = validators
+        renderer = getattr(request, 'accepted_renderer', None)
+        etag = quote_etag(make_etag(
+            request.get_full_path(),
+            getattr(renderer, 'format', None),
+            request.user.pk,
+            *parts
+        ))
+        if last_modified is not None:
+            last_modified = int(last_modified)
+            if last_modified >= int(time.time()):
+                last_modified = None
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = handler()
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            patch_vary_headers(response, ('Authorization',))
+        return response
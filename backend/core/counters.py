@@ -0,0 +1,70 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+
+class CounterFieldsMixin:
+    """
+    Модель с денормализованными счетчиками.
+
+    Счетчики меняются только атомарными UPDATE (adjust_counters), поэтому
+    обычный save() существующего объекта их не записывает: иначе
+    сохранение устаревшей копии затерло бы параллельные изменения.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+def adjust_counters(model, pks, **deltas):
+    """
+    Изменяет счетчики строк model одним UPDATE с F(); ниже нуля не опускает.
+    """
+    pks = [pks] if isinstance(pks, int) else list(pks)
+    if not pks or not deltas:
+        return 0
+    return model.objects.filter(pk__in=pks).update(**{
+        field: (
+            Greatest(F(field) + delta, Value(0)) if delta < 0
+            else F(field) + delta
+        )
+        for field, delta in deltas.items()
+    })
+
+
+def actual_count(related_model, related_field):
+    """Подзапрос COUNT(*) строк related_model, ссылающихся на строку."""
+    return Coalesce(
+        Subquery(
+            related_model.objects.filter(**{related_field: OuterRef('pk')})
+            .order_by().values(related_field)
+            .annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def reconcile_counter(model, field, related_model, related_field,
+                      dry_run=False):
+    """
+    Исправляет расхождения счетчика с фактическим числом строк;
+    возвращает их число.
+    """
+    drifted = list(
+        model.objects.annotate(
+            actual=actual_count(related_model, related_field)
+        ).exclude(**{field: F('actual')}).values_list('pk', flat=True)
+    )
+    if drifted and not dry_run:
+        model.objects.filter(pk__in=drifted).update(
+            **{field: actual_count(related_model, related_field)}
+        )
+    return len(drifted)
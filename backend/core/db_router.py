@@ -0,0 +1,94 @@
+import contextvars
+import random
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'db_pin'
+PIN_SALT = 'core.db_router.pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Модели аутентификации всегда читаются с основной базы: вход и
+# регистрация идут без учетных данных и не закрепляют клиента, а токен
+# или пользователь, только что созданные, могут еще не дойти до реплики.
+PRIMARY_READ_MODELS = ('authtoken.Token', settings.AUTH_USER_MODEL)
+
+_read_from_replica = contextvars.ContextVar('read_from_replica', default=False)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+
+
+class ReplicaRouter:
+    """
+    Чтение безопасных запросов API с реплик, все остальное — с основной базы.
+
+    Решение принимает ReplicaRoutingMiddleware для текущего запроса; вне
+    запросов (команды, обработчики очередей) всегда используется основная
+    база, как и для моделей из PRIMARY_READ_MODELS. Миграции применяются
+    только к основной базе: реплики получают изменения репликацией.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.label in PRIMARY_READ_MODELS:
+            return DEFAULT_DB_ALIAS
+        replicas = replica_aliases()
+        if replicas and _read_from_replica.get():
+            return random.choice(replicas)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def pinned(request):
+    """Клиент недавно что-то изменил и читает с основной базы."""
+    return request.get_signed_cookie(
+        PIN_COOKIE, default=None, salt=PIN_SALT,
+        max_age=settings.REPLICA_STICKY_SECONDS,
+    ) is not None
+
+
+def pin(response):
+    response.set_signed_cookie(
+        PIN_COOKIE, '1', salt=PIN_SALT,
+        max_age=settings.REPLICA_STICKY_SECONDS,
+        secure=settings.SESSION_COOKIE_SECURE,
+        httponly=True, samesite='Lax',
+    )
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Выбирает базу для чтения на время запроса.
+
+    Безопасные запросы читают с реплик. После изменяющего запроса клиент
+    на REPLICA_STICKY_SECONDS закрепляется за основной базой, чтобы сразу
+    видеть свои изменения, пока реплика догоняет. Закрепление хранится
+    у клиента в подписанной cookie с отметкой времени, а не в кэше:
+    кэш по умолчанию у каждого процесса свой, а cookie приходит в любой.
+    Срок проверяется по подписи, поэтому продлить его клиент не может.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replica_aliases():
+            return self.get_response(request)
+        safe = request.method in SAFE_METHODS
+        token = _read_from_replica.set(safe and not pinned(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_from_replica.reset(token)
+        if not safe and response.status_code < 400:
+            pin(response)
+        return response
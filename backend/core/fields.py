@@ -1,36 +1,134 @@
-import base64
-import six
+import binascii
+import io
+import re
+import tempfile
 import uuid
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
 from rest_framework import serializers
 
+# Сигнатуры форматов: смещение, байты, расширение.
+IMAGE_SIGNATURES = (
+    (0, b'\x89PNG\r\n\x1a\n', 'png'),
+    (0, b'\xff\xd8\xff', 'jpg'),
+    (0, b'GIF87a', 'gif'),
+    (0, b'GIF89a', 'gif'),
+    (8, b'WEBP', 'webp'),
+)
+CONTENT_TYPES = {
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'gif': 'image/gif',
+    'webp': 'image/webp',
+}
+NOT_BASE64 = re.compile(r'[^A-Za-z0-9+/=]')
 
-class Base64ImageField(serializers.ImageField):
 
-    def to_internal_value(self, data):
-        if isinstance(data, six.string_types):
-            if 'data:' in data and ';base64,' in data:
-                header, data = data.split(';base64,')
+def sniff_image_format(head):
+    """Расширение по первым байтам файла или None."""
+    for offset, signature, extension in IMAGE_SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            if extension == 'webp' and head[:4] != b'RIFF':
+                continue
+            return extension
+    return None
 
-            try:
-                decoded_file = base64.b64decode(data)
-            except TypeError:
-                self.fail('invalid_image')
 
-            file_name = str(uuid.uuid4())[:12]
-            file_extension = self.get_image_extension(file_name, decoded_file)
+class Base64ImageField(serializers.ImageField):
+    """
+    Изображение в base64: data URI или строка без заголовка.
+
+    Размер проверяется по длине строки до декодирования, данные
+    декодируются блоками во временный файл (в памяти до spool_size
+    байт, дальше на диске). Формат определяется по первым байтам, а
+    размеры — по заголовку изображения, так что неподходящий файл
+    отклоняется без полного декодирования.
+    """
+    chunk_size = 64 * 1024
+    spool_size = 1024 * 1024
+    default_error_messages = {
+        'too_large': 'Размер файла превышает {max_size} байт.',
+        'too_big_dimensions': (
+            'Размер изображения превышает {max_dimension} пикселей по стороне.'
+        ),
+        'unsupported_format': 'Неподдерживаемый формат изображения.',
+    }
+
+    def __init__(self, *args, max_size=None, max_dimension=None,
+                 formats=None, **kwargs):
+        self.max_size = max_size or settings.IMAGE_UPLOAD_MAX_SIZE
+        self.max_dimension = max_dimension or settings.IMAGE_MAX_DIMENSION
+        self.formats = set(formats or CONTENT_TYPES)
+        super().__init__(*args, **kwargs)
 
-            complete_file_name = "%s.%s" % (file_name, file_extension)
+    def to_internal_value(self, data):
+        if not isinstance(data, str):
+            return super().to_internal_value(data)
+        start = data.find(';base64,', 0, 256)
+        start = 0 if start == -1 else start + len(';base64,')
+        if (len(data) - start) // 4 * 3 > self.max_size:
+            self.fail('too_large', max_size=self.max_size)
 
-            data = ContentFile(decoded_file, name=complete_file_name)
+        output = tempfile.SpooledTemporaryFile(max_size=self.spool_size)
+        try:
+            extension, size = self.decode(data, start, output)
+            self.check_image(output)
+        except BaseException:
+            output.close()
+            raise
+        output.seek(0)
+        return UploadedFile(
+            output, name=f'{uuid.uuid4().hex}.{extension}',
+            content_type=CONTENT_TYPES[extension], size=size
+        )
 
-        return super(Base64ImageField, self).to_internal_value(data)
+    def decode(self, data, start, output):
+        """Декодирует data[start:] в output, возвращает (расширение, размер)."""
+        extension, size, carry = None, 0, ''
+        for position in range(start, len(data), self.chunk_size):
+            chunk = carry + NOT_BASE64.sub(
+                '', data[position:position + self.chunk_size]
+            )
+            aligned = len(chunk) - len(chunk) % 4
+            chunk, carry = chunk[:aligned], chunk[aligned:]
+            try:
+                decoded = binascii.a2b_base64(chunk)
+            except binascii.Error:
+                self.fail('invalid_image')
+            if extension is None:
+                extension = sniff_image_format(decoded)
+                if extension not in self.formats:
+                    self.fail('unsupported_format')
+                self.check_header(decoded)
+            size += len(decoded)
+            output.write(decoded)
+        if carry.strip('='):
+            self.fail('invalid_image')
+        if extension is None:
+            self.fail('empty')
+        return extension, size
 
-    def get_image_extension(self, file_name, decoded_file):
-        import imghdr
+    def check_dimensions(self, image):
+        if max(image.size) > self.max_dimension:
+            self.fail('too_big_dimensions', max_dimension=self.max_dimension)
 
-        extension = imghdr.what(file_name, decoded_file)
-        extension = "jpg" if extension == "jpeg" else extension
+    def check_header(self, head):
+        """Проверяет размеры по началу файла, если заголовок в нем целиком."""
+        try:
+            image = Image.open(io.BytesIO(head))
+        except Exception:
+            return
+        self.check_dimensions(image)
 
-        return extension 
\ No newline at end of file
+    def check_image(self, output):
+        output.seek(0)
+        try:
+            image = Image.open(output)
+            self.check_dimensions(image)
+            image.verify()
+        except serializers.ValidationError:
+            raise
+        except Exception:
+            self.fail('invalid_image')
@@ -1,16 +1,207 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import datetime
+import json
+from urllib.parse import urlencode
+
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
 
 
+PAGE_SIZE = 6
+MAX_PAGE_SIZE = 100
+
+
+class KeysetPagination(BasePagination):
+    """
+    Курсорная (keyset) пагинация по составному ключу сортировки.
+
+    Страница выбирается условием WHERE по значениям ключа последней
+    строки предыдущей страницы, поэтому глубокие страницы стоят столько
+    же, сколько первая. Ключ берется из атрибута представления
+    keyset_ordering и должен быть уникальным (последнее поле — id).
+    Общее количество считается только по запросу: ?count=exact или
+    ?count=estimate (оценка планировщика PostgreSQL).
+
+    Представление может сузить выборку методом keyset_candidates(ordering,
+    values, limit): он возвращает id строк, среди которых заведомо есть
+    вся страница (например, из более узкой таблицы с подходящим индексом),
+    или None, если сужать нечего.
+    """
+    page_size = PAGE_SIZE
+    page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = tuple(getattr(view, 'keyset_ordering', self.ordering))
+        self.page_size = self.get_page_size(request)
+        self.count = self.get_count(queryset)
+
+        values, reverse = self.decode_cursor(
+            request.query_params.get(self.cursor_query_param)
+        )
+        ordering = (
+            self.reverse_ordering(self.ordering) if reverse else self.ordering
+        )
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self.keyset_filter(ordering, values))
+        candidates = getattr(view, 'keyset_candidates', None)
+        if candidates is not None:
+            candidates = candidates(ordering, values, self.page_size + 1)
+        if candidates is not None:
+            queryset = queryset.filter(pk__in=candidates)
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = values is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, values is not None
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data
+        })
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_count(self, queryset):
+        mode = self.request.query_params.get(self.count_query_param)
+        if mode == 'exact':
+            return queryset.count()
+        if mode == 'estimate':
+            return estimate_count(queryset)
+        return None
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.build_link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.build_link(self.page[0], reverse=True)
+
+    def build_link(self, obj, reverse):
+        values = [
+            self.encode_value(self.get_value(obj, field.lstrip('-')))
+            for field in self.ordering
+        ]
+        token = json.dumps(
+            {'v': values, 'r': int(reverse)}, separators=(',', ':')
+        )
+        params = self.request.query_params.copy()
+        params[self.cursor_query_param] = base64.urlsafe_b64encode(
+            token.encode()
+        ).decode()
+        return self.request.build_absolute_uri(
+            f'{self.request.path}?{urlencode(params, doseq=True)}'
+        )
+
+    def decode_cursor(self, token):
+        if not token:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(token.encode()))
+            values, reverse = data['v'], bool(data['r'])
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    @staticmethod
+    def get_value(obj, path):
+        for attr in path.split('__'):
+            obj = getattr(obj, attr)
+        return obj
+
+    @staticmethod
+    def encode_value(value):
+        if isinstance(value, (datetime.datetime, datetime.date)):
+            return value.isoformat()
+        if value is None or isinstance(value, (int, float, str)):
+            return value
+        return str(value)
+
+    @staticmethod
+    def reverse_ordering(ordering):
+        return tuple(
+            field[1:] if field.startswith('-') else f'-{field}'
+            for field in ordering
+        )
+
+    @staticmethod
+    def keyset_filter(ordering, values):
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+
+def estimate_count(queryset):
+    """Оценка числа строк по плану запроса PostgreSQL без COUNT(*)."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
 class CustomPagination(PageNumberPagination):
-    page_size = 6
+    page_size = PAGE_SIZE
     page_size_query_param = 'limit'
-    max_page_size = 100
+    max_page_size = MAX_PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        cursor_param = KeysetPagination.cursor_query_param
+        if getattr(view, 'keyset_ordering', None) and (
+                getattr(view, 'keyset_required', False)
+                or cursor_param in request.query_params):
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
 
     def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
         return Response({
             'count': self.page.paginator.count,
             'next': self.get_next_link(),
             'previous': self.get_previous_link(),
             'results': data
-        })
\ No newline at end of file
+        })
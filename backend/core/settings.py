@@ -22,6 +22,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'users.apps.UsersConfig', 
     'recipes.apps.RecipesConfig', 
+    'images.apps.ImagesConfig',
     'rest_framework',
     'djoser',
     'drf_yasg',
@@ -35,6 +36,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.db_router.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -71,6 +73,94 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения: DB_REPLICA_HOSTS (PostgreSQL) или DB_REPLICA_NAMES
+# (например, файлы SQLite) через запятую; остальные параметры — как у
+# основной базы.
+DB_REPLICA_HOSTS = [
+    host for host in os.getenv('DB_REPLICA_HOSTS', '').split(',') if host
+]
+DB_REPLICA_NAMES = [
+    name for name in os.getenv('DB_REPLICA_NAMES', '').split(',') if name
+]
+for index in range(max(len(DB_REPLICA_HOSTS), len(DB_REPLICA_NAMES))):
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': DB_REPLICA_HOSTS[index] if index < len(DB_REPLICA_HOSTS)
+        else DATABASES['default']['HOST'],
+        'NAME': DB_REPLICA_NAMES[index] if index < len(DB_REPLICA_NAMES)
+        else DATABASES['default']['NAME'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+    }
+}
+
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', 60 * 60))
+
+# Как часто (секунд) индекс ингредиентов сверяет версию каталога с базой.
+INGREDIENT_INDEX_CHECK_INTERVAL = float(
+    os.getenv('INGREDIENT_INDEX_CHECK_INTERVAL', 5)
+)
+
+IMAGE_UPLOAD_MAX_SIZE = int(
+    os.getenv('IMAGE_UPLOAD_MAX_SIZE', 5 * 1024 * 1024)
+)
+IMAGE_MAX_DIMENSION = int(os.getenv('IMAGE_MAX_DIMENSION', 6000))
+IMAGE_VARIANT_FIELDS = (
+    ('recipes.Recipe', 'image'),
+    ('users.CustomUser', 'avatar'),
+)
+
+SHOPPING_LIST_CACHE_TIMEOUT = int(
+    os.getenv('SHOPPING_LIST_CACHE_TIMEOUT', 24 * 60 * 60)
+)
+SHOPPING_LIST_CACHE_MAX_SIZE = int(
+    os.getenv('SHOPPING_LIST_CACHE_MAX_SIZE', 1024 * 1024)
+)
+
+SEARCH_CONFIG = os.getenv('SEARCH_CONFIG', 'russian')
+
+RANKING_TRENDING_HALF_LIFE_HOURS = float(
+    os.getenv('RANKING_TRENDING_HALF_LIFE_HOURS', 24)
+)
+RANKING_TRENDING_WINDOW_DAYS = float(
+    os.getenv('RANKING_TRENDING_WINDOW_DAYS', 7)
+)
+
+# Лента подписок: при FEED_FANOUT новые рецепты рассылаются в ленты
+# подписчиков фоновым обработчиком (process_timeline_jobs); рецепты
+# авторов, у которых подписчиков больше FEED_FANOUT_MAX_FOLLOWERS,
+# читаются из подписок напрямую.
+FEED_FANOUT = os.getenv('FEED_FANOUT', 'false').lower() in ('1', 'true', 'yes')
+FEED_FANOUT_MAX_FOLLOWERS = int(os.getenv('FEED_FANOUT_MAX_FOLLOWERS', 10000))
+FEED_FOLLOW_BACKFILL = int(os.getenv('FEED_FOLLOW_BACKFILL', 100))
+
+# Кэш аутентификации по токену: LRU в памяти процесса и, если задан
+# алиас, общий кэш Django.
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 60))
+TOKEN_CACHE_ALIAS = os.getenv('TOKEN_CACHE_ALIAS') or None
+
+# Подписанные токены доступа: при AUTH_SIGNED_TOKENS вход выдает вместо
+# ключа из базы токен с id пользователя и версией, подписанный SECRET_KEY.
+AUTH_SIGNED_TOKENS = os.getenv(
+    'AUTH_SIGNED_TOKENS', 'false'
+).lower() in ('1', 'true', 'yes')
+SIGNED_TOKEN_MAX_AGE = int(os.getenv('SIGNED_TOKEN_MAX_AGE', 60 * 60))
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -103,6 +193,15 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+STORAGES = {
+    'default': {
+        'BACKEND': 'images.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
@@ -110,7 +209,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'core.authentication.SignedTokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'core.pagination.CustomPagination',
     'PAGE_SIZE': 10,
@@ -0,0 +1,154 @@
+from django.db import connections, router
+from django.db.models import Model
+from django.db.models.signals import post_delete, post_save
+
+
+def insert_ignore(model, require=None, **values):
+    """
+    Создает объект одним INSERT ... ON CONFLICT DO NOTHING RETURNING.
+
+    require=(модель, pk) добавляет условие: строка вставляется, только
+    если такая запись существует. Возвращает созданный объект или None,
+    если вставки не было (нарушение уникальности или нет записи require).
+    Одним запросом вставляется только сама строка. После вставки
+    отправляется post_save (pre_save — нет: до запроса неизвестно, будет
+    ли строка создана), и производные данные обновляют его обработчики
+    своими запросами.
+    """
+    instance = model(**values)
+    using = router.db_for_write(model, instance=instance)
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    fields = [
+        field for field in model._meta.local_concrete_fields
+        if not getattr(field, 'db_returning', False)
+    ]
+    params = [
+        field.get_db_prep_save(field.pre_save(instance, add=True), connection)
+        for field in fields
+    ]
+    # INSERT ... SELECT с WHERE: SQLite без WHERE не разбирает ON CONFLICT.
+    condition = '1 = 1'
+    if require is not None:
+        required_model, required_pk = require
+        condition = 'EXISTS (SELECT 1 FROM {} WHERE {} = %s)'.format(
+            quote(required_model._meta.db_table),
+            quote(required_model._meta.pk.column),
+        )
+        params.append(required_pk)
+    sql = (
+        'INSERT INTO {table} ({columns}) SELECT {values} WHERE {condition} '
+        'ON CONFLICT DO NOTHING RETURNING {pk}'
+    ).format(
+        table=quote(model._meta.db_table),
+        columns=', '.join(quote(field.column) for field in fields),
+        values=', '.join(['%s'] * len(fields)),
+        condition=condition,
+        pk=quote(model._meta.pk.column),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    instance.pk = row[0]
+    instance._state.adding = False
+    instance._state.db = using
+    post_save.send(
+        sender=model, instance=instance, created=True, update_fields=None,
+        raw=False, using=using
+    )
+    return instance
+
+
+def where(model, connection, filters):
+    """
+    Условие WHERE по полям: равенство, для списков и кортежей — IN.
+
+    Возвращает (sql, params).
+    """
+    quote = connection.ops.quote_name
+    conditions, params = [], []
+    for name, value in filters.items():
+        column = quote(model._meta.get_field(name).column)
+        if isinstance(value, (list, tuple)):
+            values = [
+                item.pk if isinstance(item, Model) else item
+                for item in value
+            ]
+            if not values:
+                conditions.append('1 = 0')
+                continue
+            placeholders = ', '.join(['%s'] * len(values))
+            conditions.append(f'{column} IN ({placeholders})')
+            params.extend(values)
+            continue
+        if isinstance(value, Model):
+            value = value.pk
+        conditions.append(f'{column} = %s')
+        params.append(value)
+    return ' AND '.join(conditions), params
+
+
+def delete_rows(model, **filters):
+    """
+    Удаляет строки одним DELETE без выборки и без сигналов.
+
+    Подходит для моделей, на которые никто не ссылается каскадно;
+    производные данные вызывающий код обновляет сам. Возвращает число
+    удаленных строк.
+    """
+    using = router.db_for_write(model)
+    connection = connections[using]
+    conditions, params = where(model, connection, filters)
+    sql = 'DELETE FROM {table} WHERE {conditions}'.format(
+        table=connection.ops.quote_name(model._meta.db_table),
+        conditions=conditions,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def delete_returning(model, **filters):
+    """
+    Удаляет строки по равенству полей одним DELETE ... RETURNING.
+
+    Возвращает удаленные объекты. Одним запросом удаляются только сами
+    строки; после него для каждой отправляется post_delete (pre_delete —
+    нет: строки уже удалены), и производные данные обновляют его
+    обработчики своими запросами.
+    """
+    using = router.db_for_write(model)
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    conditions, params = where(model, connection, filters)
+    fields = model._meta.concrete_fields
+    sql = 'DELETE FROM {table} WHERE {conditions} RETURNING {columns}'.format(
+        table=quote(model._meta.db_table),
+        conditions=conditions,
+        columns=', '.join(quote(field.column) for field in fields),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    columns = [field.get_col(model._meta.db_table) for field in fields]
+    converters = [
+        connection.ops.get_db_converters(column)
+        + column.get_db_converters(connection)
+        for column in columns
+    ]
+    names = [field.attname for field in fields]
+    deleted = []
+    for row in rows:
+        values = []
+        for value, column, column_converters in zip(row, columns, converters):
+            for converter in column_converters:
+                value = converter(value, column, connection)
+            values.append(value)
+        instance = model.from_db(using, names, values)
+        post_delete.send(
+            sender=model, instance=instance, using=using, origin=instance
+        )
+        deleted.append(instance)
+    return deleted
@@ -0,0 +1,64 @@
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core import db_router
+
+
+def worker_cache(name):
+    """Кэш отдельного процесса: у каждого LocMemCache со своим LOCATION."""
+    return override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': name,
+    }})
+
+
+@mock.patch.object(db_router, 'replica_aliases', lambda: ['replica_0'])
+@override_settings(REPLICA_STICKY_SECONDS=5)
+class ReplicaPinTests(SimpleTestCase):
+    """Закрепление за основной базой переходит между процессами."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.reads = []
+
+    def handle(self, request, status=200):
+        def get_response(request):
+            self.reads.append(db_router._read_from_replica.get())
+            return HttpResponse(status=status)
+        return db_router.ReplicaRoutingMiddleware(get_response)(request)
+
+    def request(self, method, response=None):
+        request = getattr(self.factory, method)('/api/recipes/')
+        if response is not None:
+            request.COOKIES.update({
+                name: morsel.value for name, morsel in response.cookies.items()
+            })
+        return request
+
+    def test_write_pins_reads_in_another_worker(self):
+        with worker_cache('worker-a'):
+            response = self.handle(self.request('post'))
+        with worker_cache('worker-b'):
+            self.handle(self.request('get', response))
+        self.assertEqual(self.reads, [False, False])
+
+    def test_reads_without_pin_use_replica(self):
+        with worker_cache('worker-b'):
+            self.handle(self.request('get'))
+        self.assertEqual(self.reads, [True])
+
+    def test_failed_write_does_not_pin(self):
+        with worker_cache('worker-a'):
+            response = self.handle(self.request('post'), status=400)
+        self.assertNotIn(db_router.PIN_COOKIE, response.cookies)
+
+    def test_expired_pin_is_ignored(self):
+        with worker_cache('worker-a'):
+            response = self.handle(self.request('post'))
+        with worker_cache('worker-b'), override_settings(
+            REPLICA_STICKY_SECONDS=-1
+        ):
+            self.handle(self.request('get', response))
+        self.assertEqual(self.reads, [False, True])
@@ -0,0 +1,23 @@
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+
+def mark_viewer_changed(*user_ids):
+    """
+    Отмечает изменение отношений пользователей: избранного, покупок, подписок.
+
+    Время хранится в строке пользователя, поэтому видно всем процессам
+    и меняется в одной транзакции с самими отношениями.
+    """
+    get_user_model().objects.filter(pk__in=user_ids).update(
+        relations_changed_at=timezone.now()
+    )
+
+
+def get_viewer_changed_at(user):
+    """Время последнего изменения отношений пользователя из базы."""
+    if not user.is_authenticated:
+        return None
+    return get_user_model().objects.filter(pk=user.pk).values_list(
+        'relations_changed_at', flat=True
+    ).first()
@@ -0,0 +1,32 @@
+from django.apps import AppConfig
+
+
+class ImagesConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'images'
+    verbose_name = 'Изображения'
+
+    def ready(self):
+        from django.apps import apps
+        from django.db.models.signals import post_delete, post_save, pre_save
+
+        from . import blobs, jobs
+
+        for model_label in {label for label, _ in jobs.variant_fields()}:
+            model = apps.get_model(model_label)
+            post_save.connect(
+                jobs.image_saved, sender=model,
+                dispatch_uid=f'image-variants:{model_label}'
+            )
+            pre_save.connect(
+                blobs.media_saving, sender=model,
+                dispatch_uid=f'media-references:{model_label}'
+            )
+            post_save.connect(
+                blobs.media_saved, sender=model,
+                dispatch_uid=f'media-references:{model_label}'
+            )
+            post_delete.connect(
+                blobs.media_deleted, sender=model,
+                dispatch_uid=f'media-references:{model_label}'
+            )
@@ -0,0 +1,223 @@
+import datetime
+import os
+import re
+from collections import Counter
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .jobs import variant_fields, variants_field
+from .models import Blob
+
+DEFAULT_GRACE = datetime.timedelta(hours=24)
+GC_BATCH_SIZE = 500
+CONTENT_NAME = re.compile(
+    r'(^|/)[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?(\.tmp)?$|\.tmp$'
+)
+
+
+def tracked_fields(model):
+    return [
+        field_name for model_label, field_name in variant_fields()
+        if model._meta.label == model_label
+    ]
+
+
+def file_references(name, variants):
+    """Имена файлов, на которые ссылается поле: оригинал и его копии."""
+    names = [name] if name else []
+    for formats in (variants or {}).get('sizes', {}).values():
+        names.extend(formats.values())
+    return names
+
+
+def instance_references(instance):
+    names = []
+    for field_name in tracked_fields(type(instance)):
+        names += file_references(
+            getattr(instance, field_name).name,
+            getattr(instance, variants_field(field_name)),
+        )
+    return Counter(names)
+
+
+def stored_references(model, pk):
+    columns = []
+    for field_name in tracked_fields(model):
+        columns += [field_name, variants_field(field_name)]
+    row = model.objects.filter(pk=pk).values(*columns).first()
+    if row is None:
+        return Counter()
+    names = []
+    for field_name in tracked_fields(model):
+        names += file_references(
+            row[field_name], row[variants_field(field_name)]
+        )
+    return Counter(names)
+
+
+def change_references(deltas):
+    """Применяет {имя файла: изменение} к счетчикам ссылок."""
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    Blob.objects.bulk_create(
+        [Blob(name=name) for name in deltas], ignore_conflicts=True
+    )
+    now = timezone.now()
+    by_delta = {}
+    for name, delta in deltas.items():
+        by_delta.setdefault(delta, []).append(name)
+    for delta, names in by_delta.items():
+        Blob.objects.filter(name__in=names).update(
+            refcount=F('refcount') + delta, updated_at=now
+        )
+
+
+def references_changed(before, after):
+    deltas = Counter(after)
+    deltas.subtract(before)
+    change_references(deltas)
+
+
+def media_saving(sender, instance, update_fields=None, **kwargs):
+    fields = tracked_fields(sender)
+    if update_fields is not None and not {
+        name for field_name in fields
+        for name in (field_name, variants_field(field_name))
+    } & set(update_fields):
+        instance._media_references = None
+        return
+    instance._media_references = (
+        stored_references(sender, instance.pk) if instance.pk else Counter()
+    )
+
+
+def media_saved(sender, instance, **kwargs):
+    before = getattr(instance, '_media_references', None)
+    if before is None:
+        return
+    instance._media_references = None
+    references_changed(before, instance_references(instance))
+
+
+def media_deleted(sender, instance, **kwargs):
+    references_changed(instance_references(instance), Counter())
+
+
+def count_references():
+    """Ссылки на файлы по данным всех отслеживаемых моделей."""
+    counter = Counter()
+    for model_label, field_name in variant_fields():
+        model = apps.get_model(model_label)
+        rows = model.objects.values_list(
+            field_name, variants_field(field_name)
+        )
+        for name, variants in rows.iterator():
+            counter.update(file_references(name, variants))
+    return counter
+
+
+def reconcile():
+    """Пересчитывает счетчики ссылок; возвращает число исправленных записей."""
+    counter = count_references()
+    blobs = {blob.name: blob for blob in Blob.objects.all()}
+    now = timezone.now()
+    changed = []
+    for name, blob in blobs.items():
+        if blob.refcount != counter.get(name, 0):
+            blob.refcount = counter.get(name, 0)
+            blob.updated_at = now
+            changed.append(blob)
+    missing = [
+        Blob(name=name, refcount=count)
+        for name, count in counter.items() if name not in blobs
+    ]
+    Blob.objects.bulk_update(
+        changed, ['refcount', 'updated_at'], batch_size=1000
+    )
+    Blob.objects.bulk_create(missing, batch_size=1000, ignore_conflicts=True)
+    return len(changed) + len(missing)
+
+
+def purge(name):
+    getattr(default_storage, 'purge', default_storage.delete)(name)
+
+
+def file_age(name):
+    try:
+        modified = default_storage.get_modified_time(name)
+    except FileNotFoundError:
+        return None
+    return timezone.now() - modified
+
+
+def collect_garbage(grace, dry_run=False):
+    """
+    Удаляет файлы без ссылок, не менявшиеся дольше grace.
+
+    Записи Blob блокируются пачками, а счетчик перепроверяется под
+    блокировкой. Возраст файла проверяется непосредственно перед
+    удалением: повторная загрузка того же содержимого обновляет время
+    изменения файла. Возвращает список удаленных имен.
+    """
+    cutoff = timezone.now() - grace
+    candidates = list(
+        Blob.objects.filter(
+            refcount__lte=0, updated_at__lt=cutoff
+        ).order_by('name').values_list('name', flat=True)
+    )
+    removed = []
+    for start in range(0, len(candidates), GC_BATCH_SIZE):
+        with transaction.atomic():
+            names = Blob.objects.select_for_update().filter(
+                name__in=candidates[start:start + GC_BATCH_SIZE],
+                refcount__lte=0, updated_at__lt=cutoff,
+            ).values_list('name', flat=True)
+            batch = []
+            for name in names:
+                age = file_age(name)
+                if age is not None and age < grace:
+                    continue
+                if not dry_run:
+                    purge(name)
+                batch.append(name)
+            if not dry_run:
+                Blob.objects.filter(name__in=batch).delete()
+        removed += batch
+    return removed
+
+
+def scan_untracked(directories, grace, dry_run=False):
+    """
+    Удаляет файлы с именами по хэшу, о которых нет записей Blob и ссылок.
+
+    Такие файлы остаются, если транзакция, сохранившая объект, была
+    отменена уже после записи файла. Учитываются и недописанные
+    временные файлы .tmp.
+    """
+    referenced = set(count_references())
+    removed = []
+    for directory in directories:
+        for root, _, files in os.walk(default_storage.path(directory)):
+            names = {
+                os.path.relpath(
+                    os.path.join(root, file), default_storage.location
+                ).replace(os.sep, '/')
+                for file in files
+            }
+            names = {name for name in names if CONTENT_NAME.search(name)}
+            known = set(Blob.objects.filter(
+                name__in=names
+            ).values_list('name', flat=True))
+            for name in sorted(names - known - referenced):
+                age = file_age(name)
+                if age is None or age < grace:
+                    continue
+                if not dry_run:
+                    purge(name)
+                removed.append(name)
+    return removed
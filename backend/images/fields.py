@@ -0,0 +1,44 @@
+from django.core.files.storage import default_storage
+from rest_framework import serializers
+
+from .variants import VARIANT_FORMATS, VARIANT_WIDTHS
+
+
+class ImageVariantsField(serializers.Field):
+    """
+    URL уменьшенных копий изображения: {ширина: {формат: URL}}.
+
+    Пока копии не готовы или относятся к прежнему файлу, вместо каждой
+    отдается URL оригинала.
+    """
+
+    def __init__(self, image_field, **kwargs):
+        self.image_field = image_field
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        file = getattr(instance, self.image_field)
+        if not file:
+            return None
+        variants = getattr(instance, f'{self.image_field}_variants') or {}
+        sizes = (
+            variants.get('sizes', {})
+            if variants.get('source') == file.name else {}
+        )
+        request = self.context.get('request')
+
+        def absolute(url):
+            return request.build_absolute_uri(url) if request else url
+
+        original = absolute(file.url)
+        return {
+            str(width): {
+                extension: absolute(
+                    default_storage.url(sizes[str(width)][extension])
+                ) if extension in sizes.get(str(width), {}) else original
+                for extension in VARIANT_FORMATS
+            }
+            for width in sorted(VARIANT_WIDTHS)
+        }
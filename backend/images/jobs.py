@@ -0,0 +1,126 @@
+import datetime
+import logging
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import ImageJob
+from .variants import generate_variants
+
+logger = logging.getLogger(__name__)
+
+LEASE = datetime.timedelta(minutes=5)
+MAX_ATTEMPTS = 3
+RETRY_DELAY = datetime.timedelta(minutes=1)
+
+
+def variant_fields():
+    """Пары (модель, поле изображения), для которых создаются варианты."""
+    return getattr(settings, 'IMAGE_VARIANT_FIELDS', ())
+
+
+def variants_field(field_name):
+    return f'{field_name}_variants'
+
+
+def image_saved(sender, instance, update_fields=None, **kwargs):
+    for model_label, field_name in variant_fields():
+        if sender._meta.label != model_label:
+            continue
+        if update_fields is not None and field_name not in update_fields:
+            continue
+        file = getattr(instance, field_name)
+        variants = getattr(instance, variants_field(field_name)) or {}
+        if file and variants.get('source') != file.name:
+            enqueue(instance, field_name)
+
+
+def enqueue(instance, field_name):
+    """Ставит в очередь генерацию вариантов текущего файла поля."""
+    job, _ = ImageJob.objects.get_or_create(
+        content_type=ContentType.objects.get_for_model(instance),
+        object_id=instance.pk,
+        field=field_name,
+        source=getattr(instance, field_name).name,
+        status=ImageJob.PENDING,
+    )
+    return job
+
+
+def claim(limit):
+    """
+    Забирает до limit готовых к запуску задач.
+
+    Задачи блокируются с SKIP LOCKED, поэтому несколько обработчиков
+    не получают одну задачу. Зависшие задачи с истекшей арендой
+    возвращаются в работу.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            ImageJob.objects.select_for_update(skip_locked=True).filter(
+                Q(status=ImageJob.PENDING, run_after__lte=now)
+                | Q(status=ImageJob.RUNNING, locked_until__lt=now)
+            ).order_by('id')[:limit]
+        )
+        ImageJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status=ImageJob.RUNNING,
+            locked_until=now + LEASE,
+            attempts=F('attempts') + 1,
+        )
+    for job in jobs:
+        job.attempts += 1
+    return jobs
+
+
+def process(job):
+    """
+    Генерирует варианты и сохраняет их в объект, если файл не сменился.
+
+    Генерация идет без блокировок, а перед записью строка перечитывается
+    с блокировкой: если за это время файл заменили, результат
+    отбрасывается (файлы вариантов подберет сборка мусора), и задача
+    старого файла не затирает варианты нового.
+    """
+    model = job.content_type.model_class()
+    instance = model.objects.filter(pk=job.object_id).first()
+    file = getattr(instance, job.field, None)
+    if not file or file.name != job.source:
+        return
+    variants = generate_variants(file)
+    field = variants_field(job.field)
+    update_fields = [field]
+    # updated_at входит в ключ кэша представления рецептов и сдвигает
+    # валидаторы условных запросов во всех процессах.
+    if any(f.name == 'updated_at' for f in model._meta.fields):
+        update_fields.append('updated_at')
+    with transaction.atomic():
+        instance = model.objects.select_for_update().filter(
+            pk=job.object_id
+        ).first()
+        file = getattr(instance, job.field, None)
+        if not file or file.name != job.source:
+            return
+        setattr(instance, field, variants)
+        instance.save(update_fields=update_fields)
+
+
+def run(job):
+    try:
+        process(job)
+    except Exception as error:
+        logger.exception('Не удалось обработать изображение %s', job.source)
+        if job.attempts >= MAX_ATTEMPTS:
+            job.status = ImageJob.FAILED
+        else:
+            job.status = ImageJob.PENDING
+            job.run_after = timezone.now() + RETRY_DELAY * job.attempts
+        job.error = str(error)
+    else:
+        job.status = ImageJob.DONE
+        job.error = ''
+    job.locked_until = None
+    job.save(update_fields=['status', 'error', 'run_after', 'locked_until'])
@@ -0,0 +1,43 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from images.blobs import (
+    DEFAULT_GRACE, collect_garbage, reconcile, scan_untracked
+)
+
+
+class Command(BaseCommand):
+    help = 'Удаляет файлы медиа, на которые не осталось ссылок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours', type=float,
+            default=DEFAULT_GRACE.total_seconds() / 3600,
+            help='Не трогать файлы, изменявшиеся позже этого срока'
+        )
+        parser.add_argument(
+            '--reconcile', action='store_true',
+            help='Сначала пересчитать счетчики ссылок по базе'
+        )
+        parser.add_argument(
+            '--scan', nargs='*', metavar='DIR',
+            help='Искать файлы без записей в указанных каталогах медиа'
+        )
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        grace = datetime.timedelta(hours=options['grace_hours'])
+        dry_run = options['dry_run']
+        if options['reconcile']:
+            self.stdout.write(f'Исправлено счетчиков: {reconcile()}')
+        removed = collect_garbage(grace, dry_run=dry_run)
+        if options['scan'] is not None:
+            removed += scan_untracked(
+                options['scan'] or ['recipes', 'avatars', 'variants'],
+                grace, dry_run=dry_run
+            )
+        for name in removed:
+            self.stdout.write(name)
+        verb = 'Будет удалено' if dry_run else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(f'{verb} файлов: {len(removed)}'))
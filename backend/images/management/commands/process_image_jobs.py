@@ -0,0 +1,55 @@
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from images.jobs import claim, enqueue, run, variant_fields, variants_field
+
+
+class Command(BaseCommand):
+    help = 'Обрабатывает очередь генерации вариантов изображений'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument(
+            '--sleep', type=float, default=5,
+            help='Пауза в секундах, когда очередь пуста'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Обработать очередь один раз и выйти'
+        )
+        parser.add_argument(
+            '--backfill', action='store_true',
+            help='Поставить в очередь изображения без вариантов'
+        )
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            self.backfill()
+        processed = 0
+        while True:
+            jobs = claim(options['batch_size'])
+            for job in jobs:
+                run(job)
+            processed += len(jobs)
+            if not jobs:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано задач: {processed}')
+        )
+
+    def backfill(self):
+        queued = 0
+        for model_label, field_name in variant_fields():
+            model = apps.get_model(model_label)
+            objects = model.objects.exclude(
+                Q(**{f'{field_name}__isnull': True}) | Q(**{field_name: ''})
+            ).filter(**{f'{variants_field(field_name)}__source__isnull': True})
+            for instance in objects.iterator():
+                enqueue(instance, field_name)
+                queued += 1
+        self.stdout.write(f'Поставлено в очередь: {queued}')
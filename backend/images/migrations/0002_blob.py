@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:53
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Имя файла')),
+                ('refcount', models.IntegerField(default=0, verbose_name='Число ссылок')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Файл',
+                'verbose_name_plural': 'Файлы',
+                'indexes': [models.Index(fields=['refcount', 'updated_at'], name='blob_garbage_idx')],
+            },
+        ),
+    ]
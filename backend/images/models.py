@@ -0,0 +1,103 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+from django.utils import timezone
+
+
+class ImageJob(models.Model):
+    """Задача фоновой генерации вариантов изображения."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Ожидает'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    content_type = models.ForeignKey(
+        ContentType,
+        on_delete=models.CASCADE,
+        verbose_name='Тип объекта',
+    )
+    object_id = models.PositiveBigIntegerField(
+        verbose_name='ID объекта',
+    )
+    field = models.CharField(
+        max_length=50,
+        verbose_name='Поле изображения',
+    )
+    source = models.CharField(
+        max_length=255,
+        verbose_name='Исходный файл',
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+        verbose_name='Статус',
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попытки',
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name='Ошибка',
+    )
+    run_after = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Запустить после',
+    )
+    locked_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Занята до',
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата создания',
+    )
+
+    class Meta:
+        verbose_name = 'Задача обработки изображения'
+        verbose_name_plural = 'Задачи обработки изображений'
+        ordering = ['id']
+        indexes = [
+            models.Index(
+                fields=['status', 'run_after'], name='image_job_queue_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.source} ({self.get_status_display()})'
+
+
+class Blob(models.Model):
+    """Файл хранилища и число ссылок на него из объектов."""
+    name = models.CharField(
+        max_length=255,
+        primary_key=True,
+        verbose_name='Имя файла',
+    )
+    refcount = models.IntegerField(
+        default=0,
+        verbose_name='Число ссылок',
+    )
+    updated_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Дата изменения',
+    )
+
+    class Meta:
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
+        indexes = [
+            models.Index(
+                fields=['refcount', 'updated_at'], name='blob_garbage_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.refcount})'
@@ -0,0 +1,75 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.utils import validate_file_name
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Файловое хранилище с именами по SHA-256 содержимого.
+
+    Файл сохраняется как <каталог>/<xx>/<хэш><расширение>, где каталог —
+    первая часть исходного имени (upload_to поля). Одинаковые файлы
+    получают одно имя, и повторная запись пропускается. Файлы могут
+    использоваться несколькими объектами, поэтому delete() ничего не
+    удаляет: неиспользуемые файлы удаляет сборщик мусора (purge) по
+    счетчикам ссылок в таблице Blob.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        # Те же проверки имени, что в Storage.save: без абсолютных путей
+        # и выхода за пределы каталога через '..'.
+        validate_file_name(name, allow_relative_path=True)
+        name = self.content_name(name, self.digest(content))
+        if self.exists(name):
+            # Свежее время изменения защищает файл от сборщика мусора.
+            os.utime(self.path(name))
+        else:
+            self.write(name, content)
+        return name
+
+    @staticmethod
+    def digest(content):
+        sha256 = hashlib.sha256()
+        for chunk in content.chunks():
+            sha256.update(chunk)
+        return sha256.hexdigest()
+
+    @staticmethod
+    def content_name(name, digest):
+        name = name.replace('\\', '/')
+        directory = name.split('/', 1)[0] if '/' in name else ''
+        extension = os.path.splitext(name)[1].lower()
+        path = f'{digest[:2]}/{digest}{extension}'
+        return f'{directory}/{path}' if directory else path
+
+    def write(self, name, content):
+        """Пишет во временный файл и атомарно переименовывает его."""
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as output:
+                for chunk in content.chunks():
+                    output.write(chunk)
+            os.chmod(temp_path, self.file_permissions_mode or 0o644)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def delete(self, name):
+        pass
+
+    def purge(self, name):
+        """Действительно удаляет файл; вызывается только сборщиком мусора."""
+        super().delete(name)
@@ -0,0 +1,63 @@
+import io
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+VARIANT_WIDTHS = (1280, 640, 320)
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+VARIANTS_DIR = 'variants'
+
+
+def variant_name(source, width, extension):
+    stem, _ = os.path.splitext(source)
+    return f'{VARIANTS_DIR}/{stem}_{width}.{extension}'
+
+
+def encode(image, image_format, options):
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    output = io.BytesIO()
+    image.save(output, image_format, **options)
+    return output.getvalue()
+
+
+def generate_variants(file):
+    """
+    Сохраняет уменьшенные копии изображения во всех форматах.
+
+    Ширины перебираются по убыванию, и каждая копия уменьшается из
+    предыдущей, а не из оригинала. Копии шире оригинала не создаются.
+    Возвращает {'source': имя оригинала, 'sizes': {ширина: {формат: имя}}}.
+    """
+    file.open('rb')
+    try:
+        image = Image.open(file)
+        if image.format == 'JPEG':
+            image.draft('RGB', (VARIANT_WIDTHS[0], VARIANT_WIDTHS[0]))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        sizes = {}
+        for width in VARIANT_WIDTHS:
+            if width >= image.width:
+                continue
+            image = image.resize(
+                (width, max(1, round(image.height * width / image.width))),
+                Image.LANCZOS
+            )
+            sizes[str(width)] = {
+                extension: default_storage.save(
+                    variant_name(file.name, width, extension),
+                    ContentFile(encode(image, image_format, options))
+                )
+                for extension, (image_format, options)
+                in VARIANT_FORMATS.items()
+            }
+    finally:
+        file.close()
+    return {'source': file.name, 'sizes': sizes}
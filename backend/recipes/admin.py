@@ -12,13 +12,13 @@ class RecipeIngredientInline(admin.TabularInline):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author', 'created_at')
+    list_display = ('name', 'author', 'created_at', 'favorites_count')
     search_fields = ('name', 'author__username', 'author__email')
     inlines = [RecipeIngredientInline]
     readonly_fields = ('count_in_favourites',)
 
     def count_in_favourites(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
     count_in_favourites.short_description = 'В избранном'
 
 @admin.register(Favorite)
@@ -4,4 +4,10 @@ from django.apps import AppConfig
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
-    verbose_name = 'Рецепты' 
\ No newline at end of file
+    verbose_name = 'Рецепты'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from . import signals
+
+        post_migrate.connect(signals.ensure_search_table, sender=self)
@@ -0,0 +1,86 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class RecipeRepresentationCache:
+    """
+    Кэш не зависящей от пользователя части RecipeSerializer.
+
+    Ключ записи состоит из id рецепта и версии, взятой из самих строк:
+    updated_at рецепта и его автора. Любое изменение рецепта, состава или
+    автора сдвигает updated_at, поэтому старые записи становятся
+    недостижимыми и вытесняются по таймауту. Отдельной инвалидации не
+    нужно, и запись из другого процесса не может сохранить устаревшие
+    данные под новой версией.
+    """
+    prefix = 'recipe-repr'
+    stats_keys = ('hits', 'misses')
+
+    def __init__(self, alias='default', timeout=None):
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def version(recipe):
+        return (
+            f'{recipe.updated_at.timestamp():.6f}'
+            f'-{recipe.author.updated_at.timestamp():.6f}'
+        )
+
+    def data_key(self, recipe, request):
+        base = request.build_absolute_uri('/') if request is not None else ''
+        host = hashlib.md5(base.encode()).hexdigest()[:8]
+        return f'{self.prefix}:data:{host}:{recipe.pk}:{self.version(recipe)}'
+
+    def get_many(self, recipes, request):
+        """Возвращает {id: данные} для найденных в кэше рецептов."""
+        keys = {
+            self.data_key(recipe, request): recipe.pk for recipe in recipes
+        }
+        if not keys:
+            return {}
+        found = self.cache.get_many(keys)
+        self.count(hits=len(found), misses=len(keys) - len(found))
+        return {keys[key]: data for key, data in found.items()}
+
+    def set(self, recipe, request, data):
+        self.cache.set(
+            self.data_key(recipe, request), data, self.get_timeout()
+        )
+
+    def get_timeout(self):
+        if self.timeout is not None:
+            return self.timeout
+        return getattr(settings, 'RECIPE_CACHE_TIMEOUT', 60 * 60)
+
+    def count(self, **deltas):
+        for name, delta in deltas.items():
+            if not delta:
+                continue
+            key = f'{self.prefix}:stats:{name}'
+            self.cache.add(key, 0, None)
+            try:
+                self.cache.incr(key, delta)
+            except ValueError:
+                self.cache.set(key, delta, None)
+
+    def stats(self):
+        keys = {
+            f'{self.prefix}:stats:{name}': name for name in self.stats_keys
+        }
+        values = self.cache.get_many(keys)
+        return {name: values.get(key, 0) for key, name in keys.items()}
+
+    def reset_stats(self):
+        self.cache.delete_many(
+            [f'{self.prefix}:stats:{name}' for name in self.stats_keys]
+        )
+
+
+recipe_cache = RecipeRepresentationCache()
@@ -1,5 +1,8 @@
 import django_filters
+from rest_framework.filters import BaseFilterBackend
 from .models import Ingredient
+from .ranking import ORDERINGS
+from .search import get_search_backend
 
 
 class IngredientFilter(django_filters.FilterSet):
@@ -11,3 +14,41 @@ class IngredientFilter(django_filters.FilterSet):
     class Meta:
         model = Ingredient
         fields = ['name']
+
+
+class RecipeSearchFilter(BaseFilterBackend):
+    """Полнотекстовый поиск рецептов по ?search= с сортировкой по релевантности."""
+    search_param = 'search'
+
+    def get_search_query(self, request):
+        return request.query_params.get(self.search_param, '').strip()
+
+    def filter_queryset(self, request, queryset, view):
+        query = self.get_search_query(request)
+        if not query:
+            return queryset
+        return get_search_backend().search(queryset, query)
+
+
+class RecipeRankingFilter(BaseFilterBackend):
+    """
+    Сортировка рецептов по ?ordering=popular|trending.
+
+    Порядок берется из предрасчитанной таблицы рейтингов (rank_recipes)
+    и совпадает с ее индексами. При поиске сортировка по релевантности
+    важнее, и параметр игнорируется.
+    """
+    ordering_param = 'ordering'
+
+    def get_ordering(self, request):
+        if RecipeSearchFilter().get_search_query(request):
+            return None
+        return ORDERINGS.get(request.query_params.get(self.ordering_param))
+
+    def filter_queryset(self, request, queryset, view):
+        ordering = self.get_ordering(request)
+        if ordering is None:
+            return queryset
+        return queryset.filter(ranking__isnull=False).select_related(
+            'ranking'
+        ).order_by(*ordering)
@@ -0,0 +1,132 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import Ingredient
+
+IndexState = namedtuple(
+    'IndexState', ('version', 'rows', 'ids', 'folded', 'keys', 'positions')
+)
+
+
+class IngredientIndex:
+    """
+    Справочник ингредиентов в памяти процесса для автодополнения.
+
+    Строки хранятся в порядке каталога (по названию), а отсортированный
+    массив названий в casefold позволяет искать префикс через bisect без
+    обращения к базе. Версия каталога — последнее updated_at и число
+    строк — сверяется с базой не чаще раза в
+    INGREDIENT_INDEX_CHECK_INTERVAL секунд; при ее изменении индекс
+    перестраивается. Сигналы Ingredient в процессе, изменившем каталог,
+    сбрасывают проверку сразу после фиксации транзакции (invalidate);
+    остальные процессы узнают об изменении по интервалу.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+        self._checked = None
+        self._generation = 0
+
+    def invalidate(self):
+        # Проверка, начатая до сброса, сохранится со старым поколением
+        # и не будет использована.
+        with self._lock:
+            self._generation += 1
+            self._checked = None
+
+    def get_version(self):
+        now = time.monotonic()
+        generation = self._generation
+        checked = self._checked
+        if (checked is not None and checked[0] == generation
+                and checked[1] > now):
+            return checked[2]
+        values = Ingredient.objects.aggregate(
+            updated=Max('updated_at'), total=Count('id')
+        )
+        version = (values['updated'], values['total'])
+        self._checked = (
+            generation, now + settings.INGREDIENT_INDEX_CHECK_INTERVAL, version
+        )
+        return version
+
+    def get_state(self):
+        version = self.get_version()
+        state = self._state
+        if state is None or state.version != version:
+            with self._lock:
+                state = self._state
+                if state is None or state.version != version:
+                    state = self._state = self.build(version)
+        return state
+
+    @staticmethod
+    def build(version):
+        rows = [
+            {'id': pk, 'name': name, 'measurement_unit': unit}
+            for pk, name, unit in Ingredient.objects.order_by(
+                'name', 'id'
+            ).values_list('id', 'name', 'measurement_unit')
+        ]
+        folded = [row['name'].casefold() for row in rows]
+        order = sorted(range(len(rows)), key=folded.__getitem__)
+        return IndexState(
+            version=version,
+            rows=rows,
+            ids=frozenset(row['id'] for row in rows),
+            folded=folded,
+            keys=[folded[i] for i in order],
+            positions=order,
+        )
+
+    @property
+    def version(self):
+        return self.get_state().version
+
+    def all(self):
+        return self.get_state().rows
+
+    def missing_ids(self, ids):
+        """
+        Id из ids, которых нет в каталоге; недостающие в индексе
+        сверяются с базой.
+        """
+        missing = set(ids) - self.get_state().ids
+        if missing:
+            missing -= set(
+                Ingredient.objects.filter(
+                    id__in=missing
+                ).values_list('id', flat=True)
+            )
+        return missing
+
+    def search(self, query):
+        """Сначала точные совпадения, затем по префиксу, затем по подстроке."""
+        state = self.get_state()
+        query = query.casefold()
+        if not query:
+            return state.rows
+        exact, prefix = [], []
+        for i in range(bisect_left(state.keys, query), len(state.keys)):
+            key = state.keys[i]
+            if not key.startswith(query):
+                break
+            (exact if key == query else prefix).append(state.positions[i])
+        found = set(exact) | set(prefix)
+        substring = [
+            i for i, name in enumerate(state.folded)
+            if query in name and i not in found
+        ]
+        return [
+            state.rows[i]
+            for i in sorted(exact) + sorted(prefix) + substring
+        ]
+
+
+ingredient_index = IngredientIndex()
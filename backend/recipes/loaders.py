@@ -0,0 +1,133 @@
+from django.db import models
+from django.db.models.functions import RowNumber
+from rest_framework import serializers
+
+from users.models import Follow
+from .models import Favorite, Recipe, ShoppingCart
+
+
+class ViewerState:
+    """
+    Отношения текущего пользователя к объектам ответа.
+
+    Идентификаторы рецептов и авторов текущей страницы регистрируются
+    заранее, а избранное, список покупок и подписки загружаются одним
+    запросом на каждый вид отношения при первом обращении. Значения,
+    уже посчитанные аннотациями queryset, берутся без запросов.
+    """
+    FAVORITE = 'favorite'
+    CART = 'cart'
+    FOLLOW = 'follow'
+
+    def __init__(self, user):
+        if user is None or not user.is_authenticated:
+            user = None
+        self.user = user
+        kinds = (self.FAVORITE, self.CART, self.FOLLOW)
+        self._pending = {kind: set() for kind in kinds}
+        self._loaded = {kind: set() for kind in kinds}
+        self._found = {kind: set() for kind in kinds}
+
+    def add_recipes(self, recipe_ids):
+        recipe_ids = set(recipe_ids)
+        self._pending[self.FAVORITE] |= recipe_ids
+        self._pending[self.CART] |= recipe_ids
+
+    def add_authors(self, author_ids):
+        self._pending[self.FOLLOW] |= set(author_ids)
+
+    def is_favorited(self, recipe):
+        return self._resolve(self.FAVORITE, recipe, 'is_favorited')
+
+    def is_in_shopping_cart(self, recipe):
+        return self._resolve(self.CART, recipe, 'is_in_shopping_cart')
+
+    def is_subscribed(self, author):
+        return self._resolve(self.FOLLOW, author, 'is_subscribed')
+
+    def _resolve(self, kind, obj, annotation):
+        value = getattr(obj, annotation, None)
+        if value is not None:
+            return bool(value)
+        if self.user is None:
+            return False
+        if obj.pk not in self._loaded[kind]:
+            ids = (self._pending[kind] | {obj.pk}) - self._loaded[kind]
+            self._found[kind] |= set(self._fetch(kind, ids))
+            self._loaded[kind] |= ids
+            self._pending[kind].clear()
+        return obj.pk in self._found[kind]
+
+    def _fetch(self, kind, ids):
+        if kind == self.FOLLOW:
+            return Follow.objects.filter(
+                follower=self.user, leader_id__in=ids
+            ).values_list('leader_id', flat=True)
+        model = Favorite if kind == self.FAVORITE else ShoppingCart
+        return model.objects.filter(
+            user=self.user, recipe_id__in=ids
+        ).values_list('recipe_id', flat=True)
+
+
+def get_recipes_limit(request):
+    """Значение ?recipes_limit= или None, если оно не задано или неверно."""
+    if request is None:
+        return None
+    try:
+        limit = int(request.query_params['recipes_limit'])
+    except (KeyError, ValueError, TypeError):
+        return None
+    return max(limit, 0)
+
+
+def attach_recipe_previews(authors, limit=None, attr='recipe_previews'):
+    """
+    Загружает последние рецепты авторов страницы одним запросом.
+
+    Первые limit рецептов каждого автора выбираются оконной функцией
+    ROW_NUMBER() OVER (PARTITION BY author ORDER BY created_at DESC)
+    и раскладываются в атрибут attr автора.
+    """
+    authors = list(authors)
+    previews = {author.pk: [] for author in authors}
+    if not previews or limit == 0:
+        for author in authors:
+            setattr(author, attr, [])
+        return authors
+    queryset = Recipe.objects.filter(author_id__in=previews)
+    if limit is not None:
+        queryset = queryset.annotate(
+            row_number=models.Window(
+                RowNumber(),
+                partition_by=[models.F('author_id')],
+                order_by=[
+                    models.F('created_at').desc(), models.F('id').desc()
+                ],
+            )
+        ).filter(row_number__lte=limit)
+    for recipe in queryset.order_by('author_id', '-created_at', '-id'):
+        previews[recipe.author_id].append(recipe)
+    for author in authors:
+        setattr(author, attr, previews[author.pk])
+    return authors
+
+
+def get_viewer_state(context):
+    """ViewerState запроса; создается в контексте сериализатора."""
+    state = context.get('viewer_state')
+    if state is None:
+        request = context.get('request')
+        state = ViewerState(getattr(request, 'user', None))
+        context['viewer_state'] = state
+    return state
+
+
+class ViewerStateListSerializer(serializers.ListSerializer):
+    """Регистрирует объекты страницы в ViewerState перед сериализацией."""
+
+    def to_representation(self, data):
+        if isinstance(data, models.manager.BaseManager):
+            data = data.all()
+        iterable = list(data)
+        self.child.prime_viewer_state(get_viewer_state(self.context), iterable)
+        return super().to_representation(iterable)
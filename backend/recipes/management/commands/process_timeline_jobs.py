@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.timeline import backfill, run_next
+
+
+class Command(BaseCommand):
+    help = 'Рассылает новые рецепты в ленты подписчиков'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sleep', type=float, default=5,
+            help='Пауза в секундах, когда очередь пуста'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Обработать очередь один раз и выйти'
+        )
+        parser.add_argument(
+            '--backfill', action='store_true',
+            help='Поставить в очередь неразосланные рецепты'
+        )
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Очистить ленты и разослать все рецепты заново'
+        )
+
+    def handle(self, *args, **options):
+        if options['backfill'] or options['rebuild']:
+            queued = backfill(rebuild=options['rebuild'])
+            self.stdout.write(f'Поставлено в очередь: {queued}')
+        processed = 0
+        while True:
+            if run_next():
+                processed += 1
+                continue
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано задач: {processed}')
+        )
@@ -0,0 +1,39 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.ranking import recompute_rankings
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рейтинги рецептов для сортировки popular и trending'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--half-life-hours', type=float,
+            default=settings.RANKING_TRENDING_HALF_LIFE_HOURS,
+            help='За сколько часов вес добавления уменьшается вдвое'
+        )
+        parser.add_argument(
+            '--window-days', type=float,
+            default=settings.RANKING_TRENDING_WINDOW_DAYS,
+            help='Учитывать добавления не старше стольких дней'
+        )
+        parser.add_argument(
+            '--interval', type=float,
+            help='Пересчитывать в цикле с паузой в секундах'
+        )
+
+    def handle(self, *args, **options):
+        half_life = timedelta(hours=options['half_life_hours'])
+        window = timedelta(days=options['window_days'])
+        while True:
+            ranked = recompute_rankings(half_life, window)
+            self.stdout.write(
+                self.style.SUCCESS(f'Пересчитано рейтингов: {ranked}')
+            )
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if hasattr(backend, 'ensure_table'):
+            backend.ensure_table()
+        ids = list(Recipe.objects.order_by('id').values_list('id', flat=True))
+        batch_size = options['batch_size']
+        for start in range(0, len(ids), batch_size):
+            backend.update(ids[start:start + batch_size])
+        self.stdout.write(
+            self.style.SUCCESS(f'Проиндексировано рецептов: {len(ids)}')
+        )
@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.shopping_list import (
+    rebuild_shopping_lists, shopping_list_mismatches
+)
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает списки покупок и сверяет их с корзинами'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только сверить таблицу с корзинами, ничего не меняя'
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            created = rebuild_shopping_lists()
+            self.stdout.write(f'Записано позиций: {created}')
+        ids = list(get_user_model().objects.order_by('pk').values_list(
+            'pk', flat=True
+        ))
+        batch_size = options['batch_size']
+        mismatches = 0
+        for start in range(0, len(ids), batch_size):
+            rows = shopping_list_mismatches(ids[start:start + batch_size])
+            for user_id, ingredient_id, expected, stored in rows:
+                mismatches += 1
+                self.stdout.write(
+                    f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                    f'ожидалось {expected}, записано {stored}'
+                )
+        if mismatches:
+            raise CommandError(f'Найдено расхождений: {mismatches}')
+        self.stdout.write(
+            self.style.SUCCESS('Списки покупок совпадают с корзинами')
+        )
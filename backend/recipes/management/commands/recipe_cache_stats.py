@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from recipes.cache import recipe_cache
+
+
+class Command(BaseCommand):
+    help = 'Показывает статистику попаданий в кэш представлений рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true', help='Обнулить счетчики'
+        )
+
+    def handle(self, *args, **options):
+        stats = recipe_cache.stats()
+        total = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / total * 100 if total else 0
+        self.stdout.write(
+            f'Попаданий: {stats["hits"]}, промахов: {stats["misses"]}, '
+            f'доля попаданий: {ratio:.1f}%'
+        )
+        if options['reset']:
+            recipe_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS('Счетчики обнулены'))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from core.counters import reconcile_counter
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import CustomUser, Follow
+
+COUNTERS = (
+    (CustomUser, 'recipes_count', Recipe, 'author'),
+    (CustomUser, 'followers_count', Follow, 'leader'),
+    (CustomUser, 'following_count', Follow, 'follower'),
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'shopping_carts_count', ShoppingCart, 'recipe'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет денормализованные счетчики с данными '
+        'и исправляет расхождения'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать расхождения'
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        for model, field, related_model, related_field in COUNTERS:
+            drifted = reconcile_counter(
+                model, field, related_model, related_field,
+                dry_run=options['dry_run']
+            )
+            total += drifted
+            self.stdout.write(
+                f'{model._meta.model_name}.{field}: расхождений {drifted}'
+            )
+        verb = 'Найдено' if options['dry_run'] else 'Исправлено'
+        self.stdout.write(self.style.SUCCESS(f'{verb} расхождений: {total}'))
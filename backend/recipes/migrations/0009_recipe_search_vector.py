@@ -0,0 +1,55 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:41
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        # GIN-индекс объявлен в Recipe.Meta.indexes (миграция 0016).
+        schema_editor.execute(
+            "UPDATE recipes_recipe r SET search_vector = "
+            "setweight(to_tsvector(%s::regconfig, r.name), 'A') || "
+            "setweight(to_tsvector(%s::regconfig, r.text), 'B') || "
+            "setweight(to_tsvector(%s::regconfig, COALESCE(("
+            "SELECT string_agg(i.name, ' ') FROM recipes_recipeingredient ri "
+            "JOIN recipes_ingredient i ON i.id = ri.ingredient_id "
+            "WHERE ri.recipe_id = r.id), '')), 'C')",
+            [settings.SEARCH_CONFIG] * 3
+        )
+    elif connection.vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_fts '
+            'USING fts5(name, text, ingredients)'
+        )
+        schema_editor.execute(
+            "INSERT INTO recipes_recipe_fts (rowid, name, text, ingredients) "
+            "SELECT r.id, r.name, r.text, COALESCE(("
+            "SELECT group_concat(i.name, ' ') FROM recipes_recipeingredient ri "
+            "JOIN recipes_ingredient i ON i.id = ri.ingredient_id "
+            "WHERE ri.recipe_id = r.id), '') FROM recipes_recipe r"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS recipes_recipe_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_updated_at_ingredient_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
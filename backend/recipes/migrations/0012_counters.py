@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:55
+
+from django.db import migrations, models
+
+from core.counters import reconcile_counter
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model('users', 'CustomUser')
+    Follow = apps.get_model('users', 'Follow')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Favorite = apps.get_model('recipes', 'Favorite')
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    reconcile_counter(User, 'recipes_count', Recipe, 'author')
+    reconcile_counter(User, 'followers_count', Follow, 'leader')
+    reconcile_counter(User, 'following_count', Follow, 'follower')
+    reconcile_counter(Recipe, 'favorites_count', Favorite, 'recipe')
+    reconcile_counter(Recipe, 'shopping_carts_count', ShoppingCart, 'recipe')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_image_variants'),
+        ('users', '0004_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='shopping_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В списках покупок'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:20
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def fill_created_at(apps, schema_editor):
+    # Точное время добавления старых записей неизвестно; берется время
+    # создания рецепта, чтобы они не попали разом в «популярное сейчас».
+    Recipe = apps.get_model('recipes', 'Recipe')
+    for name in ('Favorite', 'ShoppingCart'):
+        model = apps.get_model('recipes', name)
+        model.objects.update(created_at=Subquery(
+            Recipe.objects.filter(pk=OuterRef('recipe_id')).values('created_at')[:1]
+        ))
+
+
+def fill_rankings(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeRanking = apps.get_model('recipes', 'RecipeRanking')
+    RecipeRanking.objects.bulk_create([
+        RecipeRanking(
+            recipe_id=pk,
+            popular_score=2 * favorites + carts,
+        )
+        for pk, favorites, carts in Recipe.objects.values_list(
+            'pk', 'favorites_count', 'shopping_carts_count'
+        ).iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favorite',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_created_at, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='RecipeRanking',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ranking', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('popular_score', models.FloatField(default=0, verbose_name='Популярность')),
+                ('trending_score', models.FloatField(default=0, verbose_name='Популярность за последнее время')),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата расчета')),
+            ],
+            options={
+                'verbose_name': 'Рейтинг рецепта',
+                'verbose_name_plural': 'Рейтинги рецептов',
+                'indexes': [models.Index(fields=['-popular_score', '-recipe'], name='ranking_popular_idx'), models.Index(fields=['-trending_score', '-recipe'], name='ranking_trending_idx')],
+            },
+        ),
+        migrations.RunPython(fill_rankings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:40
+
+from django.db import migrations
+import recipes.models
+
+
+def drop_raw_index(apps, schema_editor):
+    # Индекс, созданный прежней версией 0009 вручную, заменяется
+    # объявленным в модели.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS recipe_search_vector_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_timeline'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_raw_index, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=recipes.models.SearchVectorIndex(fields=['search_vector'], name='recipe_search_vector_gin'),
+        ),
+    ]
@@ -1,10 +1,25 @@
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
+from django.utils import timezone
+
+from core.counters import CounterFieldsMixin
 
 MIN_QUANTITY = 1
 MAX_QUANTITY = 32_000
 
+
+class SearchVectorIndex(GinIndex):
+    """GIN-индекс на PostgreSQL, обычный индекс на прочих СУБД."""
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return models.Index.create_sql(self, model, schema_editor, **kwargs)
+        return super().create_sql(model, schema_editor, using=using, **kwargs)
+
+
 class Ingredient(models.Model):
     name = models.CharField(
         verbose_name='Название ингредиента',
@@ -14,6 +29,10 @@ class Ingredient(models.Model):
         verbose_name='Единица измерения',
         max_length=20,
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
 
     class Meta:
         verbose_name = 'Ингредиент'
@@ -23,7 +42,7 @@ class Ingredient(models.Model):
     def __str__(self):
         return f'{self.name} ({self.measurement_unit})'
 
-class Recipe(models.Model):
+class Recipe(CounterFieldsMixin, models.Model):
     author = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -43,6 +62,12 @@ class Recipe(models.Model):
         null=True,
         blank=True,
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии изображения',
+    )
     ingredients = models.ManyToManyField(
         Ingredient,
         through='RecipeIngredient',
@@ -66,11 +91,55 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации',
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name='Дата изменения',
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор',
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном',
+    )
+    shopping_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В списках покупок',
+    )
+
+    fanned_out = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name='Разослан в ленты подписчиков',
+    )
+
+    # fanned_out меняет только рассылка (recipes.timeline) атомарным
+    # UPDATE: сохранение устаревшей копии не должно сбрасывать флаг.
+    counter_fields = ('favorites_count', 'shopping_carts_count', 'fanned_out')
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(
+                fields=['-created_at', '-id'],
+                name='recipe_created_at_id_idx',
+            ),
+            models.Index(
+                fields=['author', '-created_at', '-id'],
+                name='recipe_author_created_idx',
+            ),
+            SearchVectorIndex(
+                fields=['search_vector'],
+                name='recipe_search_vector_gin',
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -121,6 +190,11 @@ class Favorite(models.Model):
         related_name='favorites',
         verbose_name='Рецепт',
     )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления',
+    )
 
     class Meta:
         unique_together = ('user', 'recipe')
@@ -143,6 +217,11 @@ class ShoppingCart(models.Model):
         related_name='shopping_carts',
         verbose_name='Рецепт',
     )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления',
+    )
 
     class Meta:
         unique_together = ('user', 'recipe')
@@ -152,6 +231,133 @@ class ShoppingCart(models.Model):
     def __str__(self):
         return f'{self.user} добавил {self.recipe} в покупки'
 
+class RecipeRanking(models.Model):
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='ranking',
+        verbose_name='Рецепт',
+    )
+    popular_score = models.FloatField(
+        default=0,
+        verbose_name='Популярность',
+    )
+    trending_score = models.FloatField(
+        default=0,
+        verbose_name='Популярность за последнее время',
+    )
+    computed_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Дата расчета',
+    )
+
+    class Meta:
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинги рецептов'
+        indexes = [
+            models.Index(
+                fields=['-popular_score', '-recipe'],
+                name='ranking_popular_idx',
+            ),
+            models.Index(
+                fields=['-trending_score', '-recipe'],
+                name='ranking_trending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe}: {self.popular_score:.1f} / {self.trending_score:.1f}'
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Рецепт',
+    )
+    created_at = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_timeline_entry',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-created_at', '-recipe'],
+                name='timeline_user_created_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
+
+class TimelineJob(models.Model):
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='timeline_job',
+        verbose_name='Рецепт',
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попыток',
+    )
+    run_after = models.DateTimeField(
+        default=timezone.now,
+        db_index=True,
+        verbose_name='Не раньше',
+    )
+
+    class Meta:
+        verbose_name = 'Рассылка рецепта в ленты'
+        verbose_name_plural = 'Рассылки рецептов в ленты'
+
+    def __str__(self):
+        return f'Рассылка {self.recipe}'
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент',
+    )
+    total_amount = models.PositiveIntegerField(
+        verbose_name='Общее количество',
+    )
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient} - {self.total_amount} для {self.user}'
+
 class Subscription(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -0,0 +1,76 @@
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Favorite, Recipe, RecipeRanking, ShoppingCart
+
+ORDERINGS = {
+    'popular': ('-ranking__popular_score', '-id'),
+    'trending': ('-ranking__trending_score', '-id'),
+}
+# Добавление в избранное весит больше, чем в список покупок.
+ACTIVITY_WEIGHTS = (
+    (Favorite, 2.0),
+    (ShoppingCart, 1.0),
+)
+BATCH_SIZE = 1000
+
+
+def popular_scores():
+    """Итоговая популярность по денормализованным счетчикам рецептов."""
+    weights = dict(ACTIVITY_WEIGHTS)
+    for pk, favorites, carts in Recipe.objects.values_list(
+        'pk', 'favorites_count', 'shopping_carts_count'
+    ).iterator(chunk_size=BATCH_SIZE):
+        yield pk, weights[Favorite] * favorites + weights[ShoppingCart] * carts
+
+
+def trending_scores(now, half_life, window):
+    """
+    Популярность за последнее время.
+
+    Каждое добавление в окне window вносит свой вес, который убывает
+    вдвое за каждый half_life; более старые добавления не учитываются.
+    """
+    decay = math.log(2) / half_life.total_seconds()
+    scores = defaultdict(float)
+    for model, weight in ACTIVITY_WEIGHTS:
+        rows = model.objects.filter(
+            created_at__gte=now - window
+        ).values_list('recipe_id', 'created_at')
+        for recipe_id, created_at in rows.iterator(chunk_size=BATCH_SIZE):
+            age = max((now - created_at).total_seconds(), 0)
+            scores[recipe_id] += weight * math.exp(-decay * age)
+    return scores
+
+
+def recompute_rankings(half_life=None, window=None):
+    """Пересчитывает рейтинги всех рецептов; возвращает их число."""
+    if half_life is None:
+        half_life = timedelta(hours=settings.RANKING_TRENDING_HALF_LIFE_HOURS)
+    if window is None:
+        window = timedelta(days=settings.RANKING_TRENDING_WINDOW_DAYS)
+    now = timezone.now()
+    trending = trending_scores(now, half_life, window)
+    rankings = [
+        RecipeRanking(
+            recipe_id=pk,
+            popular_score=popular,
+            trending_score=trending.get(pk, 0.0),
+            computed_at=now,
+        )
+        for pk, popular in popular_scores()
+    ]
+    with transaction.atomic():
+        RecipeRanking.objects.bulk_create(
+            rankings,
+            batch_size=BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['recipe'],
+            update_fields=['popular_score', 'trending_score', 'computed_at'],
+        )
+    return len(rankings)
@@ -0,0 +1,83 @@
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from core.counters import adjust_counters
+from core.statements import delete_rows
+from core.versions import mark_viewer_changed
+from .models import Recipe, ShoppingCart
+from .shopping_list import apply_cart_change, lock_users
+from .signals import RELATION_COUNTERS
+
+MAX_BATCH_SIZE = 100
+
+ADDED = 'added'
+EXISTS = 'exists'
+REMOVED = 'removed'
+MISSING = 'missing'
+NOT_FOUND = 'not_found'
+
+
+def relations_changed(model, user_id, recipe_ids, sign):
+    """
+    Обновляет производные данные после пакетного изменения связей.
+
+    bulk_create и удаление одним DELETE сигналов не отправляют, поэтому
+    счетчики рецептов, список покупок и метка состояния пользователя
+    обновляются здесь явно, как это делают обработчики сигналов.
+    """
+    if not recipe_ids:
+        return
+    adjust_counters(Recipe, recipe_ids, **{RELATION_COUNTERS[model]: sign})
+    if model is ShoppingCart:
+        apply_cart_change(user_id, recipe_ids, sign)
+    mark_viewer_changed(user_id)
+
+
+def relation_state(model, user, recipe_ids):
+    """Одним запросом: какие рецепты существуют и какие уже связаны с user."""
+    return dict(
+        Recipe.objects.filter(pk__in=recipe_ids).annotate(
+            present=Exists(
+                model.objects.filter(user=user, recipe=OuterRef('pk'))
+            )
+        ).values_list('pk', 'present')
+    )
+
+
+def add_relations(model, user, recipe_ids):
+    """Добавляет рецепты в избранное или корзину; возвращает {id: статус}."""
+    with transaction.atomic():
+        # Блокировка пользователя упорядочивает его изменения, и
+        # проверенное состояние не устаревает до вставки. Как и в
+        # toggle_relation, она берется до записи связей: порядок
+        # блокировок везде один (пользователь, связи, счетчики рецептов).
+        lock_users([user.pk])
+        state = relation_state(model, user, recipe_ids)
+        added = [pk for pk in recipe_ids if state.get(pk) is False]
+        model.objects.bulk_create(
+            [model(user=user, recipe_id=pk) for pk in added],
+            ignore_conflicts=True,
+        )
+        relations_changed(model, user.pk, added, 1)
+    return {
+        pk: NOT_FOUND if pk not in state else EXISTS if state[pk] else ADDED
+        for pk in recipe_ids
+    }
+
+
+def remove_relations(model, user, recipe_ids):
+    """
+    Удаляет рецепты из избранного или корзины одним DELETE;
+    возвращает {id: статус}.
+    """
+    with transaction.atomic():
+        lock_users([user.pk])
+        state = relation_state(model, user, recipe_ids)
+        removed = [pk for pk in recipe_ids if state.get(pk)]
+        if removed:
+            delete_rows(model, user=user, recipe=removed)
+        relations_changed(model, user.pk, removed, -1)
+    return {
+        pk: NOT_FOUND if pk not in state else REMOVED if state[pk] else MISSING
+        for pk in recipe_ids
+    }
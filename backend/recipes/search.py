@@ -0,0 +1,151 @@
+import re
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+
+from .models import Ingredient, Recipe, RecipeIngredient
+
+FTS_TABLE = 'recipes_recipe_fts'
+
+
+def search_terms(query):
+    """Слова запроса без операторов полнотекстового синтаксиса."""
+    return re.findall(r'\w+', query.lower())
+
+
+class PostgresRecipeSearch:
+    """Поиск по tsvector-колонке Recipe.search_vector с GIN-индексом."""
+
+    @property
+    def config(self):
+        return getattr(settings, 'SEARCH_CONFIG', 'russian')
+
+    def update(self, recipe_ids):
+        from django.contrib.postgres.aggregates import StringAgg
+        from django.contrib.postgres.search import SearchVector
+
+        names = RecipeIngredient.objects.filter(
+            recipe=OuterRef('pk')
+        ).values('recipe').annotate(
+            names=StringAgg('ingredient__name', ' ')
+        ).values('names')
+        Recipe.objects.filter(pk__in=recipe_ids).update(
+            search_vector=(
+                SearchVector('name', weight='A', config=self.config)
+                + SearchVector('text', weight='B', config=self.config)
+                + SearchVector(
+                    Coalesce(Subquery(names), Value('')),
+                    weight='C', config=self.config
+                )
+            )
+        )
+
+    def delete(self, recipe_ids):
+        pass
+
+    def search(self, queryset, query):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        terms = search_terms(query)
+        if not terms:
+            return queryset.none()
+        tsquery = SearchQuery(
+            ' & '.join(f'{term}:*' for term in terms),
+            config=self.config, search_type='raw'
+        )
+        return queryset.filter(search_vector=tsquery).annotate(
+            search_rank=SearchRank(F('search_vector'), tsquery)
+        ).order_by('-search_rank', '-id')
+
+
+class SQLiteRecipeSearch:
+    """Поиск через виртуальную таблицу FTS5 для локальной разработки."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def ensure_table(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+                'USING fts5(name, text, ingredients)'
+            )
+
+    def update(self, recipe_ids):
+        recipe_ids = [int(pk) for pk in recipe_ids]
+        if not recipe_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        ingredient_table = Ingredient._meta.db_table
+        recipe_table = Recipe._meta.db_table
+        self.delete(recipe_ids)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, text, ingredients) '
+                f'SELECT r.id, r.name, r.text, COALESCE(('
+                f'SELECT group_concat(i.name, \' \') '
+                f'FROM {RecipeIngredient._meta.db_table} ri '
+                f'JOIN {ingredient_table} i ON i.id = ri.ingredient_id '
+                f'WHERE ri.recipe_id = r.id), \'\') '
+                f'FROM {recipe_table} r WHERE r.id IN ({placeholders})',
+                recipe_ids
+            )
+
+    def delete(self, recipe_ids):
+        recipe_ids = [int(pk) for pk in recipe_ids]
+        if not recipe_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+                recipe_ids
+            )
+
+    def search(self, queryset, query):
+        terms = search_terms(query)
+        if not terms:
+            return queryset.none()
+        match = ' '.join(f'"{term}"*' for term in terms)
+        table = Recipe._meta.db_table
+        return queryset.filter(
+            id__in=RawSQL(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+                [match]
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                f'SELECT -bm25({FTS_TABLE}, 10.0, 4.0, 1.0) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+                [match]
+            )
+        ).order_by('-search_rank', '-id')
+
+
+class NullRecipeSearch:
+    """Запасной вариант для прочих СУБД: поиск по названию."""
+
+    def update(self, recipe_ids):
+        pass
+
+    def delete(self, recipe_ids):
+        pass
+
+    def search(self, queryset, query):
+        return queryset.filter(name__icontains=query)
+
+
+def get_search_backend(using=None):
+    connection = connections[using or router.db_for_write(Recipe)]
+    if connection.vendor == 'postgresql':
+        return PostgresRecipeSearch()
+    if connection.vendor == 'sqlite':
+        return SQLiteRecipeSearch(connection)
+    return NullRecipeSearch()
+
+
+def reindex_recipes(recipe_ids):
+    get_search_backend().update(list(recipe_ids))
@@ -1,21 +1,87 @@
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import serializers
-from .models import Ingredient, Recipe, RecipeIngredient, Favorite, ShoppingCart
+from .models import (
+    Ingredient, Recipe, RecipeIngredient, Favorite, ShoppingCart,
+    MIN_QUANTITY, MAX_QUANTITY,
+)
 from users.models import CustomUser
-from .fields import Base64ImageField
+from core.fields import Base64ImageField
+from images.fields import ImageVariantsField
+from .cache import recipe_cache
+from .ingredient_index import ingredient_index
+from .loaders import ViewerStateListSerializer, get_viewer_state
+from .relations import MAX_BATCH_SIZE
+from .signals import collect_recipe_changes
+
+
+def ingredients_prefetch():
+    return Prefetch(
+        'recipeingredient_set',
+        queryset=RecipeIngredient.objects.select_related('ingredient')
+    )
+
+
+def save_recipe_ingredients(recipe, ingredients_data, created=False):
+    """
+    Записывает состав рецепта пакетными запросами.
+
+    Для нового рецепта строки создаются одним bulk_create. При изменении
+    состав сравнивается с текущим: новые ингредиенты добавляются,
+    изменившиеся количества обновляются одним bulk_update, а удаляются
+    только исключенные ингредиенты.
+    """
+    amounts = {
+        int(item['id']): int(item['amount']) for item in ingredients_data
+    }
+    existing = {} if created else {
+        row.ingredient_id: row
+        for row in RecipeIngredient.objects.filter(recipe=recipe).only(
+            'id', 'ingredient_id', 'amount'
+        )
+    }
+    removed = [
+        row.pk for ingredient_id, row in existing.items()
+        if ingredient_id not in amounts
+    ]
+    changed = []
+    for ingredient_id, row in existing.items():
+        if ingredient_id in amounts and row.amount != amounts[ingredient_id]:
+            row.amount = amounts[ingredient_id]
+            changed.append(row)
+    new = [
+        RecipeIngredient(recipe=recipe, ingredient_id=ingredient_id, amount=amount)
+        for ingredient_id, amount in amounts.items()
+        if ingredient_id not in existing
+    ]
+
+    with collect_recipe_changes() as recipe_ids:
+        if removed:
+            RecipeIngredient.objects.filter(pk__in=removed).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        if new:
+            RecipeIngredient.objects.bulk_create(new)
+        if removed or changed or new:
+            recipe_ids.add(recipe.pk)
+
 
 class UserSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
     avatar = serializers.SerializerMethodField()
+    avatar_variants = ImageVariantsField('avatar')
 
     class Meta:
         model = CustomUser
-        fields = ('id', 'email', 'username', 'first_name', 'last_name', 'is_subscribed', 'avatar')
+        fields = ('id', 'email', 'username', 'first_name', 'last_name', 'is_subscribed', 'avatar',
+                  'avatar_variants')
+        list_serializer_class = ViewerStateListSerializer
+
+    def prime_viewer_state(self, state, users):
+        state.add_authors(user.pk for user in users)
 
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return False
-        return obj.subscribers.filter(user=request.user).exists()
+        return get_viewer_state(self.context).is_subscribed(obj)
     
     def get_avatar(self, obj):
         request = self.context.get('request')
@@ -30,9 +96,11 @@ class RecipeAuthorSerializer(UserSerializer):
 
 
 class RecipeSubscriptionSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField('image')
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -53,7 +121,16 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
 
 class IngredientInRecipeSerializer(serializers.Serializer):
     id = serializers.IntegerField()
-    amount = serializers.IntegerField(min_value=1)
+    amount = serializers.IntegerField(min_value=MIN_QUANTITY, max_value=MAX_QUANTITY)
+
+class RecipeListSerializer(ViewerStateListSerializer):
+    """Читает страницу рецептов из кэша одним запросом к нему."""
+
+    def to_representation(self, data):
+        data = list(data.all() if hasattr(data, 'all') else data)
+        self.child.load_cached(data)
+        return super().to_representation(data)
+
 
 class RecipeSerializer(serializers.ModelSerializer):
     ingredients = serializers.SerializerMethodField()
@@ -61,12 +138,55 @@ class RecipeSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = Base64ImageField(required=True)
+    image_variants = ImageVariantsField('image')
 
     class Meta:
         model = Recipe
         fields = ('id', 'author', 'ingredients', 'is_favorited',
-                 'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time')
+                 'is_in_shopping_cart', 'name', 'image', 'image_variants', 'text',
+                 'cooking_time')
         read_only_fields = ('author',)
+        list_serializer_class = RecipeListSerializer
+
+    def prime_viewer_state(self, state, recipes):
+        state.add_recipes(recipe.pk for recipe in recipes)
+        state.add_authors(recipe.author_id for recipe in recipes)
+
+    def load_cached(self, recipes):
+        request = self.context.get('request')
+        self._cached = recipe_cache.get_many(recipes, request)
+        prefetch_related_objects(
+            [recipe for recipe in recipes if recipe.pk not in self._cached],
+            ingredients_prefetch()
+        )
+
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        cached = getattr(self, '_cached', None)
+        if cached is None:
+            self.load_cached([instance])
+            cached = self._cached
+        if instance.pk in cached:
+            return self.overlay_viewer_state(cached.pop(instance.pk), instance)
+        data = super().to_representation(instance)
+        recipe_cache.set(instance, self.context.get('request'), {
+            **data,
+            'is_favorited': None,
+            'is_in_shopping_cart': None,
+            'author': {**data['author'], 'is_subscribed': None},
+        })
+        return data
+
+    def overlay_viewer_state(self, data, instance):
+        state = get_viewer_state(self.context)
+        data['is_favorited'] = state.is_favorited(instance)
+        data['is_in_shopping_cart'] = state.is_in_shopping_cart(instance)
+        data['author'] = {
+            **data['author'],
+            'is_subscribed': state.is_subscribed(instance.author),
+        }
+        return data
 
     def get_ingredients(self, obj):
         return RecipeIngredientSerializer(
@@ -74,75 +194,68 @@ class RecipeSerializer(serializers.ModelSerializer):
         ).data
 
     def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return Favorite.objects.filter(
-                user=request.user, recipe=obj
-            ).exists()
-        return False
+        return get_viewer_state(self.context).is_favorited(obj)
 
     def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return ShoppingCart.objects.filter(
-                user=request.user, recipe=obj
-            ).exists()
-        return False
+        return get_viewer_state(self.context).is_in_shopping_cart(obj)
+
+    def validate(self, attrs):
+        attrs['ingredients'] = self.validate_ingredients(
+            self.initial_data.get('ingredients', [])
+        )
+        return attrs
 
     def validate_ingredients(self, value):
         if not value:
-            raise serializers.ValidationError('Список ингредиентов не может быть пустым.')
+            raise serializers.ValidationError(
+                {'ingredients': 'Список ингредиентов не может быть пустым.'}
+            )
+
+        serializer = IngredientInRecipeSerializer(data=value, many=True)
+        if not serializer.is_valid():
+            raise serializers.ValidationError({'ingredients': serializer.errors})
+        items = serializer.validated_data
 
-        ingredient_ids = [item['id'] for item in value]
+        ingredient_ids = [item['id'] for item in items]
         if len(ingredient_ids) != len(set(ingredient_ids)):
-            raise serializers.ValidationError('Ингредиенты не должны повторяться.')
+            raise serializers.ValidationError(
+                {'ingredients': 'Ингредиенты не должны повторяться.'}
+            )
 
-        for item in value:
-            serializer = IngredientInRecipeSerializer(data=item)
-            serializer.is_valid(raise_exception=True)
-            if not Ingredient.objects.filter(id=item['id']).exists():
-                raise serializers.ValidationError(f'Ингредиент с id={item["id"]} не существует.')
-        return value
+        missing = ingredient_index.missing_ids(ingredient_ids)
+        if missing:
+            raise serializers.ValidationError({'ingredients': [
+                f'Ингредиент с id={pk} не существует.' for pk in sorted(missing)
+            ]})
+        return items
 
     def create(self, validated_data):
-        ingredients_data = self.context['request'].data.get('ingredients', [])
-        self.validate_ingredients(ingredients_data)
+        ingredients_data = validated_data.pop('ingredients')
         image_data = validated_data.pop('image')
 
-        recipe = Recipe.objects.create(image=image_data, **validated_data)
-
-        for ingredient_data in ingredients_data:
-            RecipeIngredient.objects.create(
-                recipe=recipe,
-                ingredient_id=ingredient_data['id'],
-                amount=ingredient_data['amount']
-            )
+        with transaction.atomic(), collect_recipe_changes():
+            recipe = Recipe.objects.create(image=image_data, **validated_data)
+            save_recipe_ingredients(recipe, ingredients_data, created=True)
 
         return recipe
 
     def update(self, instance, validated_data):
-        ingredients_data = self.context['request'].data.get('ingredients', [])
-        self.validate_ingredients(ingredients_data)
-        
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        
-        if ingredients_data:
-            instance.recipeingredient_set.all().delete()
-            for ingredient_data in ingredients_data:
-                RecipeIngredient.objects.create(
-                    recipe=instance,
-                    ingredient_id=ingredient_data['id'],
-                    amount=ingredient_data['amount']
-                )
-        
-        instance.save()
+        ingredients_data = validated_data.pop('ingredients')
+
+        with transaction.atomic(), collect_recipe_changes():
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save()
+            save_recipe_ingredients(instance, ingredients_data)
+
         return instance
 
 class RecipeMinifiedSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField('image')
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
 
 class FavoriteSerializer(serializers.ModelSerializer):
     recipe = RecipeMinifiedSerializer(read_only=True)
@@ -158,4 +271,16 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
     class Meta:
         model = ShoppingCart
         fields = ('user', 'recipe')
-        read_only_fields = ('user', 'recipe') 
\ No newline at end of file
+        read_only_fields = ('user', 'recipe')
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BATCH_SIZE,
+    )
+
+    def validate_recipes(self, value):
+        # Повторы схлопываются, порядок первого появления сохраняется.
+        return list(dict.fromkeys(value))
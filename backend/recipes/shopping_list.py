@@ -0,0 +1,394 @@
+import csv
+import hashlib
+import json
+import os
+import tempfile
+
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+
+from .models import RecipeIngredient, ShoppingCart, ShoppingListItem
+
+CHUNK_ROWS = 200
+BATCH_SIZE = 1000
+CACHE_PREFIX = 'shopping-list'
+PDF_FONT_NAME = 'ShoppingListFont'
+
+
+def shopping_list_rows(user):
+    """Позиции списка покупок пользователя из таблицы ShoppingListItem."""
+    return ShoppingListItem.objects.filter(user=user).values(
+        'ingredient_id', 'ingredient__name', 'ingredient__measurement_unit',
+        'total_amount'
+    ).order_by(
+        'ingredient__name', 'ingredient_id'
+    ).iterator(chunk_size=CHUNK_ROWS)
+
+
+def lock_users(user_ids):
+    """
+    Блокирует строки пользователей до конца транзакции.
+
+    Параллельные изменения списка покупок одного пользователя выполняются
+    по очереди, поэтому суммы не теряются при одновременных запросах.
+    """
+    list(
+        get_user_model().objects.select_for_update().filter(
+            pk__in=user_ids
+        ).order_by('pk').values_list('pk', flat=True)
+    )
+
+
+def cart_totals(user_ids=None):
+    """Суммы ингредиентов по корзинам, посчитанные по рецептам."""
+    carts = ShoppingCart.objects.all()
+    if user_ids is not None:
+        carts = carts.filter(user_id__in=user_ids)
+    rows = carts.values(
+        'user_id', 'recipe__recipeingredient__ingredient_id'
+    ).annotate(
+        total_amount=Sum('recipe__recipeingredient__amount')
+    ).order_by()
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        if row['recipe__recipeingredient__ingredient_id'] is not None:
+            yield (
+                row['user_id'],
+                row['recipe__recipeingredient__ingredient_id'],
+                row['total_amount'],
+            )
+
+
+def apply_cart_change(user_id, recipe_ids, sign):
+    """
+    Прибавляет (sign=1) или вычитает (sign=-1) ингредиенты рецептов
+    из списка покупок пользователя.
+
+    Выполняется в транзакции вызывающего кода, если она открыта.
+    """
+    deltas = {
+        row['ingredient_id']: sign * row['total']
+        for row in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values('ingredient_id').annotate(total=Sum('amount')).order_by()
+    }
+    if not deltas:
+        return
+    with transaction.atomic():
+        lock_users([user_id])
+        _apply_deltas(user_id, deltas)
+
+
+def _apply_deltas(user_id, deltas):
+    items = {
+        item.ingredient_id: item
+        for item in ShoppingListItem.objects.filter(
+            user_id=user_id, ingredient_id__in=deltas
+        )
+    }
+    changed, removed, created = [], [], []
+    for ingredient_id, delta in deltas.items():
+        item = items.get(ingredient_id)
+        if item is None:
+            if delta > 0:
+                created.append(ShoppingListItem(
+                    user_id=user_id, ingredient_id=ingredient_id,
+                    total_amount=delta
+                ))
+            continue
+        item.total_amount += delta
+        if item.total_amount > 0:
+            changed.append(item)
+        else:
+            removed.append(item.pk)
+    if removed:
+        ShoppingListItem.objects.filter(pk__in=removed).delete()
+    if changed:
+        ShoppingListItem.objects.bulk_update(changed, ['total_amount'])
+    if created:
+        ShoppingListItem.objects.bulk_create(created)
+
+
+def rebuild_shopping_lists(user_ids=None):
+    """
+    Пересчитывает списки покупок пользователей по их корзинам.
+
+    Без user_ids перестраивается вся таблица. Возвращает число
+    записанных позиций.
+    """
+    if user_ids is not None:
+        user_ids = set(user_ids)
+        if not user_ids:
+            return 0
+    with transaction.atomic():
+        return _rebuild(user_ids)
+
+
+def _rebuild(user_ids):
+    items = ShoppingListItem.objects.all()
+    if user_ids is not None:
+        lock_users(user_ids)
+        items = items.filter(user_id__in=user_ids)
+    items.delete()
+    rows = (
+        ShoppingListItem(
+            user_id=user_id, ingredient_id=ingredient_id,
+            total_amount=total_amount
+        )
+        for user_id, ingredient_id, total_amount in cart_totals(user_ids)
+    )
+    created = 0
+    while batch := list(islice(rows, BATCH_SIZE)):
+        ShoppingListItem.objects.bulk_create(batch)
+        created += len(batch)
+    return created
+
+
+def refresh_cart_shopping_lists(recipe_ids):
+    """Пересчитывает списки покупок тех, у кого рецепты лежат в корзине."""
+    rebuild_shopping_lists(
+        ShoppingCart.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('user_id', flat=True).distinct()
+    )
+
+
+def shopping_list_mismatches(user_ids):
+    """
+    Расхождения таблицы с корзинами:
+    (user_id, ingredient_id, ожидалось, записано).
+    """
+    expected = {
+        (user_id, ingredient_id): total_amount
+        for user_id, ingredient_id, total_amount in cart_totals(user_ids)
+    }
+    stored = {
+        (user_id, ingredient_id): total_amount
+        for user_id, ingredient_id, total_amount in
+        ShoppingListItem.objects.filter(user_id__in=user_ids).values_list(
+            'user_id', 'ingredient_id', 'total_amount'
+        )
+    }
+    return [
+        (*key, expected.get(key), stored.get(key))
+        for key in sorted(expected.keys() | stored.keys())
+        if expected.get(key) != stored.get(key)
+    ]
+
+
+def chunked(lines):
+    """Склеивает строки в блоки, чтобы не отдавать ответ по одной строке."""
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= CHUNK_ROWS:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def render_txt(rows):
+    yield 'Список покупок:\n\n'
+    for item in rows:
+        yield (
+            f"{item['ingredient__name']} "
+            f"({item['ingredient__measurement_unit']}) - "
+            f"{item['total_amount']}\n"
+        )
+
+
+class _Line:
+    """Буфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(['Ингредиент', 'Единица измерения', 'Количество'])
+    for item in rows:
+        yield writer.writerow([
+            item['ingredient__name'],
+            item['ingredient__measurement_unit'],
+            item['total_amount'],
+        ])
+
+
+def render_json(rows):
+    yield '['
+    separator = ''
+    for item in rows:
+        yield separator + json.dumps({
+            'name': item['ingredient__name'],
+            'measurement_unit': item['ingredient__measurement_unit'],
+            'amount': item['total_amount'],
+        }, ensure_ascii=False)
+        separator = ','
+    yield ']'
+
+
+def pdf_available():
+    try:
+        import reportlab  # noqa: F401
+    except ImportError:
+        return False
+    return os.path.exists(settings.SHOPPING_LIST_PDF_FONT)
+
+
+def render_pdf(rows):
+    """
+    Пишет PDF во временный файл на диске.
+
+    Формат PDF требует таблицу смещений в конце файла, поэтому документ
+    нельзя отдавать по мере генерации; страницы сбрасываются в файл,
+    а ответ читает его блоками.
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    if PDF_FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(
+            TTFont(PDF_FONT_NAME, settings.SHOPPING_LIST_PDF_FONT)
+        )
+    output = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    pdf = canvas.Canvas(output, pagesize=A4)
+    width, height = A4
+    margin, line_height = 50, 18
+    y = height - margin
+    pdf.setFont(PDF_FONT_NAME, 16)
+    pdf.drawString(margin, y, 'Список покупок')
+    y -= line_height * 2
+    pdf.setFont(PDF_FONT_NAME, 12)
+    for item in rows:
+        if y < margin:
+            pdf.showPage()
+            pdf.setFont(PDF_FONT_NAME, 12)
+            y = height - margin
+        pdf.drawString(margin, y, (
+            f"{item['ingredient__name']} "
+            f"({item['ingredient__measurement_unit']}) - "
+            f"{item['total_amount']}"
+        ))
+        y -= line_height
+    pdf.save()
+    output.seek(0)
+    return output
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': ('text/plain; charset=utf-8', render_txt),
+    'csv': ('text/csv; charset=utf-8', render_csv),
+    'json': ('application/json', render_json),
+    'pdf': ('application/pdf', render_pdf),
+}
+
+
+def available_formats():
+    return [
+        name for name in SHOPPING_LIST_FORMATS
+        if name != 'pdf' or pdf_available()
+    ]
+
+
+def cart_fingerprint(user):
+    """
+    Отпечаток корзины: хэш id рецептов в ней и их updated_at.
+
+    updated_at рецепта сдвигается при любом изменении его состава или
+    ингредиентов, поэтому изменение корзины или рецепта в ней дает новый
+    отпечаток. Возвращает (отпечаток, время последнего изменения рецептов).
+    """
+    rows = list(
+        ShoppingCart.objects.filter(user=user).values_list(
+            'recipe_id', 'recipe__updated_at'
+        ).order_by('recipe_id')
+    )
+    fingerprint = hashlib.sha1(repr([
+        (recipe_id, updated_at.isoformat()) for recipe_id, updated_at in rows
+    ]).encode()).hexdigest()
+    return fingerprint, max((row[1] for row in rows), default=None)
+
+
+def cache_key(export_format, fingerprint):
+    return f'{CACHE_PREFIX}:{export_format}:{fingerprint}'
+
+
+def store(key, content):
+    if len(content) <= settings.SHOPPING_LIST_CACHE_MAX_SIZE:
+        cache.set(key, content, settings.SHOPPING_LIST_CACHE_TIMEOUT)
+
+
+def caching(chunks, user, export_format, fingerprint):
+    """
+    Отдает блоки ответа, попутно собирая их для кэша.
+
+    Результат сохраняется, только если файл отдан целиком, не превышает
+    лимита и корзина не изменилась за время выгрузки. Собранное
+    отбрасывается, как только превышен лимит, поэтому в памяти не
+    бывает больше SHOPPING_LIST_CACHE_MAX_SIZE байт.
+    """
+    buffer, size = [], 0
+    for chunk in chunks:
+        if buffer is not None:
+            buffer.append(chunk.encode())
+            size += len(buffer[-1])
+            if size > settings.SHOPPING_LIST_CACHE_MAX_SIZE:
+                buffer = None
+        yield chunk
+    if buffer is not None and cart_fingerprint(user)[0] == fingerprint:
+        store(cache_key(export_format, fingerprint), b''.join(buffer))
+
+
+def attachment(response, export_format):
+    response['Content-Disposition'] = (
+        f'attachment; filename=shopping_list.{export_format}'
+    )
+    return response
+
+
+def shopping_list_response(user, export_format, fingerprint=None):
+    """
+    Ответ с файлом списка покупок в формате export_format.
+
+    С отпечатком корзины готовый файл берется из кэша, а новый
+    сохраняется в кэш под этим отпечатком.
+    """
+    content_type, render = SHOPPING_LIST_FORMATS[export_format]
+    if fingerprint is not None:
+        content = cache.get(cache_key(export_format, fingerprint))
+        if content is not None:
+            return attachment(
+                HttpResponse(content, content_type=content_type), export_format
+            )
+    rows = shopping_list_rows(user)
+    if export_format == 'pdf':
+        output = render(rows)
+        # В кэш — только небольшие файлы: большой PDF не читается
+        # в память целиком, а отдается с диска блоками.
+        output.seek(0, os.SEEK_END)
+        size = output.tell()
+        if (fingerprint is not None
+                and size <= settings.SHOPPING_LIST_CACHE_MAX_SIZE):
+            output.seek(0)
+            store(cache_key(export_format, fingerprint), output.read())
+        output.seek(0)
+        return FileResponse(
+            output, as_attachment=True,
+            filename=f'shopping_list.{export_format}',
+            content_type=content_type
+        )
+    chunks = chunked(render(rows))
+    if fingerprint is not None:
+        chunks = caching(chunks, user, export_format, fingerprint)
+    return attachment(
+        StreamingHttpResponse(chunks, content_type=content_type), export_format
+    )
@@ -0,0 +1,188 @@
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.counters import adjust_counters
+from core.versions import mark_viewer_changed
+from users.models import CustomUser, Follow
+from .models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, RecipeRanking, ShoppingCart
+)
+from .ingredient_index import ingredient_index
+from .search import get_search_backend, reindex_recipes
+from .shopping_list import (
+    apply_cart_change, rebuild_shopping_lists, refresh_cart_shopping_lists
+)
+from . import timeline
+
+RELATION_COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'shopping_carts_count',
+}
+
+_collector = threading.local()
+
+
+def touch_recipes(recipe_ids):
+    """
+    Обновляет updated_at рецептов, не вызывая сигналов сохранения.
+
+    От updated_at зависит ключ кэша представления рецепта.
+    """
+    Recipe.objects.filter(pk__in=recipe_ids).update(updated_at=timezone.now())
+
+
+def ingredients_changed(recipe_ids, amounts=True):
+    """
+    Обновляет производные данные рецептов после изменения состава.
+
+    При amounts=False (переименование ингредиента) списки покупок
+    не пересчитываются: суммы в них от названий не зависят.
+    """
+    recipe_ids = set(recipe_ids)
+    if not recipe_ids:
+        return
+    touch_recipes(recipe_ids)
+    reindex_recipes(recipe_ids)
+    if amounts:
+        refresh_cart_shopping_lists(recipe_ids)
+
+
+@contextmanager
+def collect_recipe_changes():
+    """
+    Откладывает пересчет производных данных рецептов до конца блока.
+
+    Сигналы сохранения рецептов и их ингредиентов внутри блока только
+    запоминают id, а при выходе данные пересчитываются один раз на
+    рецепт. Пакетные операции (bulk_create, bulk_update) сигналов не
+    отправляют, поэтому их рецепты добавляются в возвращаемое множество.
+    """
+    recipe_ids = getattr(_collector, 'recipe_ids', None)
+    if recipe_ids is not None:
+        yield recipe_ids
+        return
+    recipe_ids = _collector.recipe_ids = set()
+    try:
+        yield recipe_ids
+    finally:
+        _collector.recipe_ids = None
+    ingredients_changed(recipe_ids)
+
+
+def collecting(recipe_id):
+    recipe_ids = getattr(_collector, 'recipe_ids', None)
+    if recipe_ids is None:
+        return False
+    recipe_ids.add(recipe_id)
+    return True
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def recipe_changed(sender, instance, signal, **kwargs):
+    if signal is post_save and collecting(instance.pk):
+        return
+    if signal is post_delete:
+        get_search_backend().delete([instance.pk])
+    else:
+        reindex_recipes([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def recipe_counted(sender, instance, signal, created=False, **kwargs):
+    if signal is post_delete or created:
+        adjust_counters(
+            CustomUser, instance.author_id,
+            recipes_count=1 if created else -1
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_ranked(sender, instance, created, **kwargs):
+    # Нулевой рейтинг до ближайшего пересчета, чтобы рецепт сразу
+    # попадал в выдачу с сортировкой по популярности.
+    if created:
+        RecipeRanking.objects.create(recipe=instance)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_published(sender, instance, created, **kwargs):
+    if created and settings.FEED_FANOUT:
+        timeline.enqueue(instance)
+
+
+@receiver([post_save, post_delete], sender=Follow)
+def follow_timeline_changed(sender, instance, signal, created=False, **kwargs):
+    if not settings.FEED_FANOUT:
+        return
+    if created:
+        timeline.follow_added(instance.follower_id, instance.leader_id)
+    elif signal is post_delete:
+        timeline.follow_removed(instance.follower_id, instance.leader_id)
+
+
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    if not collecting(instance.recipe_id):
+        ingredients_changed([instance.recipe_id])
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    ingredients_changed(
+        RecipeIngredient.objects.filter(
+            ingredient_id=instance.pk
+        ).values_list('recipe_id', flat=True),
+        amounts=False
+    )
+    transaction.on_commit(ingredient_index.invalidate)
+
+
+@receiver([post_save, post_delete], sender=Favorite)
+@receiver([post_save, post_delete], sender=ShoppingCart)
+def viewer_relation_changed(sender, instance, **kwargs):
+    mark_viewer_changed(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Favorite)
+@receiver([post_save, post_delete], sender=ShoppingCart)
+def relation_counted(sender, instance, signal, created=False, **kwargs):
+    if signal is post_delete or created:
+        adjust_counters(
+            Recipe, instance.recipe_id,
+            **{RELATION_COUNTERS[sender]: 1 if created else -1}
+        )
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_saved(sender, instance, created, **kwargs):
+    if created:
+        apply_cart_change(instance.user_id, [instance.recipe_id], 1)
+    else:
+        rebuild_shopping_lists([instance.user_id])
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def shopping_cart_deleting(sender, instance, **kwargs):
+    # delete() отправляет pre_delete, пока ингредиенты каскадно
+    # удаляемого рецепта еще на месте.
+    apply_cart_change(instance.user_id, [instance.recipe_id], -1)
+    instance._cart_applied = True
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def shopping_cart_deleted(sender, instance, **kwargs):
+    # delete_returning отправляет только post_delete.
+    if not getattr(instance, '_cart_applied', False):
+        apply_cart_change(instance.user_id, [instance.recipe_id], -1)
+
+
+def ensure_search_table(sender, using, **kwargs):
+    backend = get_search_backend(using)
+    if hasattr(backend, 'ensure_table'):
+        backend.ensure_table()
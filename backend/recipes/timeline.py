@@ -0,0 +1,199 @@
+import datetime
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from core.pagination import KeysetPagination
+from users.models import CustomUser, Follow
+from .models import Recipe, TimelineEntry, TimelineJob
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+MAX_ATTEMPTS = 3
+RETRY_DELAY = datetime.timedelta(minutes=1)
+
+
+def feed_condition(user):
+    """
+    Условие на рецепты ленты подписок пользователя.
+
+    Без рассылки рецепты выбираются по подпискам. С рассылкой лента
+    читается из записей пользователя, а рецепты, которые еще не
+    разосланы (очередь, авторы с очень большим числом подписчиков,
+    рецепты до включения рассылки), по-прежнему берутся из подписок.
+    Условие задает состав ленты для подсчета и валидаторов; страницы
+    выбираются по индексу записей через feed_candidates.
+    """
+    followed = Follow.objects.filter(follower=user).values('leader')
+    if not settings.FEED_FANOUT:
+        return Q(author__in=followed)
+    return (
+        Q(pk__in=TimelineEntry.objects.filter(user=user).values('recipe'))
+        | Q(author__in=followed, fanned_out=False)
+    )
+
+
+def feed_candidates(user, ordering, values, limit):
+    """
+    Id рецептов, среди которых есть страница ленты при рассылке.
+
+    Разосланные рецепты берутся из записей пользователя по индексу
+    (user, created_at, recipe), неразосланные — из подписок; из каждого
+    источника не больше limit строк после курсора values. Страница —
+    первые limit рецептов объединения в порядке ordering. Без рассылки
+    сужать нечего, и возвращается None.
+    """
+    if not settings.FEED_FANOUT:
+        return None
+    entry_ordering = tuple(
+        f'{field[:-2]}recipe_id' if field.lstrip('-') == 'id' else field
+        for field in ordering
+    )
+    entries = TimelineEntry.objects.filter(user=user).order_by(*entry_ordering)
+    pulled = Recipe.objects.filter(
+        author__in=Follow.objects.filter(follower=user).values('leader'),
+        fanned_out=False,
+    ).order_by(*ordering)
+    if values is not None:
+        entries = entries.filter(
+            KeysetPagination.keyset_filter(entry_ordering, values)
+        )
+        pulled = pulled.filter(
+            KeysetPagination.keyset_filter(ordering, values)
+        )
+    return (
+        list(entries.values_list('recipe_id', flat=True)[:limit])
+        + list(pulled.values_list('pk', flat=True)[:limit])
+    )
+
+
+def pull_author(author_id):
+    """Слишком популярный автор: его рецепты в ленты не рассылаются."""
+    return CustomUser.objects.filter(
+        pk=author_id,
+        followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS,
+    ).exists()
+
+
+def enqueue(recipe):
+    TimelineJob.objects.get_or_create(recipe=recipe)
+
+
+def fan_out(recipe):
+    """
+    Добавляет рецепт в ленты всех подписчиков автора; возвращает их число.
+
+    Подписки блокируются до конца транзакции: отписка, начатая во время
+    рассылки, дождется ее и удалит уже записанные строки, а подписка,
+    удаленная раньше, в выборку не попадет.
+    """
+    total = 0
+    batch = []
+    with transaction.atomic():
+        followers = Follow.objects.select_for_update().filter(
+            leader_id=recipe.author_id
+        ).order_by('follower_id').values_list('follower_id', flat=True)
+        for follower_id in followers.iterator(chunk_size=BATCH_SIZE):
+            batch.append(TimelineEntry(
+                user_id=follower_id, recipe_id=recipe.pk,
+                created_at=recipe.created_at,
+            ))
+            if len(batch) >= BATCH_SIZE:
+                TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+                total += len(batch)
+                batch = []
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+    return total + len(batch)
+
+
+def process(job):
+    recipe = Recipe.objects.filter(pk=job.recipe_id).first()
+    if recipe is None or recipe.fanned_out or pull_author(recipe.author_id):
+        return 0
+    delivered = fan_out(recipe)
+    Recipe.objects.filter(pk=recipe.pk).update(fanned_out=True)
+    return delivered
+
+
+def run_next():
+    """
+    Выполняет одну готовую задачу рассылки; возвращает False, если их нет.
+
+    Задача блокируется с SKIP LOCKED и удаляется в той же транзакции,
+    что и рассылка. После MAX_ATTEMPTS неудач задача снимается: рецепт
+    остается неразосланным и читается из подписок.
+    """
+    job = None
+    try:
+        with transaction.atomic():
+            job = TimelineJob.objects.select_for_update(
+                skip_locked=True
+            ).filter(
+                run_after__lte=timezone.now()
+            ).order_by('run_after').first()
+            if job is None:
+                return False
+            process(job)
+            job.delete()
+    except Exception:
+        if job is None:
+            raise
+        logger.exception('Не удалось разослать рецепт %s', job.recipe_id)
+        if job.attempts + 1 >= MAX_ATTEMPTS:
+            TimelineJob.objects.filter(pk=job.pk).delete()
+        else:
+            TimelineJob.objects.filter(pk=job.pk).update(
+                attempts=F('attempts') + 1,
+                run_after=timezone.now() + RETRY_DELAY * (job.attempts + 1),
+            )
+    return True
+
+
+def follow_added(follower_id, leader_id):
+    """Добавляет в ленту нового подписчика последние рецепты автора."""
+    TimelineEntry.objects.bulk_create([
+        TimelineEntry(user_id=follower_id, recipe_id=pk, created_at=created_at)
+        for pk, created_at in Recipe.objects.filter(
+            author_id=leader_id
+        ).order_by('-created_at', '-id').values_list(
+            'pk', 'created_at'
+        )[:settings.FEED_FOLLOW_BACKFILL]
+    ], ignore_conflicts=True)
+
+
+def follow_removed(follower_id, leader_id):
+    # Вызывается после удаления подписки: параллельная рассылка держит
+    # блокировку ее строки, и к этому моменту ее записи уже видны.
+    TimelineEntry.objects.filter(
+        user_id=follower_id, recipe__author_id=leader_id
+    ).delete()
+
+
+def backfill(rebuild=False):
+    """
+    Ставит в очередь рассылку неразосланных рецептов.
+
+    При rebuild ленты сначала очищаются: это нужно после периода, когда
+    рассылка была выключена и подписки менялись без обновления лент.
+    """
+    if rebuild:
+        TimelineEntry.objects.all().delete()
+        Recipe.objects.filter(fanned_out=True).update(fanned_out=False)
+    pks = Recipe.objects.filter(
+        fanned_out=False,
+        author__followers_count__lte=settings.FEED_FANOUT_MAX_FOLLOWERS,
+    ).values_list('pk', flat=True)
+    queued = 0
+    batch = []
+    for pk in pks.iterator(chunk_size=BATCH_SIZE):
+        batch.append(TimelineJob(recipe_id=pk))
+        if len(batch) >= BATCH_SIZE:
+            TimelineJob.objects.bulk_create(batch, ignore_conflicts=True)
+            queued += len(batch)
+            batch = []
+    TimelineJob.objects.bulk_create(batch, ignore_conflicts=True)
+    return queued + len(batch)
@@ -1,48 +1,119 @@
-from rest_framework import viewsets, permissions, filters, status
-from .models import Ingredient, Recipe, RecipeIngredient, Favorite, ShoppingCart
+from rest_framework import viewsets, permissions, status
+from .models import Ingredient, Recipe, Favorite, ShoppingCart
 from .serializers import (
     IngredientSerializer, RecipeSerializer, RecipeIngredientSerializer,
-    FavoriteSerializer, ShoppingCartSerializer
+    FavoriteSerializer, ShoppingCartSerializer, RecipeIdsSerializer
 )
 from .permissions import IsOwnerOrReadOnly, IsAdminOrAuthorOrReadOnly
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.permissions import AllowAny
-from django.http import HttpResponse
-from django.db.models import Sum, F
-from collections import defaultdict
+from django.db import transaction
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.db.models import Exists, OuterRef, Value, BooleanField, Max, Count
 import logging
 from django_filters.rest_framework import DjangoFilterBackend
-from .filters import IngredientFilter
+from .filters import IngredientFilter, RecipeRankingFilter, RecipeSearchFilter
+from .ingredient_index import ingredient_index
+from .relations import add_relations, remove_relations
+from .shopping_list import (
+    available_formats, cart_fingerprint, lock_users, shopping_list_response
+)
+from .signals import collect_recipe_changes
+from .timeline import feed_candidates, feed_condition
+from users.models import Follow
+from core.conditional import ConditionalGetMixin, to_timestamp
+from core.statements import delete_returning, insert_ignore
+from core.versions import get_viewer_changed_at
 
 logger = logging.getLogger(__name__)
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = IngredientFilter
     pagination_class = None
 
-    def get_queryset(self):
-        name = self.request.query_params.get('name')
-        queryset = Ingredient.objects.all()
-        if name:
-            queryset = queryset.filter(name__istartswith=name)
-        return queryset
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        updated, total = ingredient_index.version
+        return self.conditional_response(
+            request,
+            ((updated, total), None),
+            lambda: Response(
+                ingredient_index.search(name) if name
+                else ingredient_index.all()
+            )
+        )
+
+    def get_object_validators(self, queryset):
+        updated = queryset.values_list('updated_at', flat=True).first()
+        if updated is None:
+            return None
+        return (updated,), to_timestamp(updated)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     permission_classes = [IsAdminOrAuthorOrReadOnly]
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['name', 'author__username', 'tags__name']
+    filter_backends = [RecipeSearchFilter, RecipeRankingFilter]
     parser_classes = (MultiPartParser, FormParser, JSONParser)
 
+    @property
+    def ranking_ordering(self):
+        if RecipeRankingFilter not in self.filter_backends:
+            return None
+        return RecipeRankingFilter().get_ordering(self.request)
+
+    @property
+    def keyset_ordering(self):
+        if (RecipeSearchFilter in self.filter_backends
+                and RecipeSearchFilter().get_search_query(self.request)):
+            return None
+        return self.ranking_ordering or ('-created_at', '-id')
+
+    @property
+    def keyset_required(self):
+        # Рейтинги пересчитываются, а лента пополняется между запросами:
+        # номера страниц давали бы пропуски и повторы, курсор устойчив.
+        return self.action == 'feed' or self.ranking_ordering is not None
+
+    def keyset_candidates(self, ordering, values, limit):
+        if self.action != 'feed':
+            return None
+        return feed_candidates(self.request.user, ordering, values, limit)
+
     def get_queryset(self):
-        queryset = Recipe.objects.all()
+        user = self.request.user
+        queryset = Recipe.objects.select_related('author')
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_favorited=Exists(Favorite.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+                author_is_subscribed=Value(True) if self.action == 'feed'
+                else Exists(Follow.objects.filter(
+                    follower=user, leader=OuterRef('author')
+                )),
+            )
+            if self.action == 'feed':
+                queryset = queryset.filter(feed_condition(user))
+        else:
+            false = Value(False, output_field=BooleanField())
+            queryset = queryset.annotate(
+                is_favorited=false,
+                is_in_shopping_cart=false,
+                author_is_subscribed=false,
+            )
+
         author = self.request.query_params.get('author')
         tags = self.request.query_params.getlist('tags')
         is_favorited = self.request.query_params.get('is_favorited')
@@ -52,23 +123,55 @@ class RecipeViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(author_id=author)
         if tags:
             queryset = queryset.filter(tags__slug__in=tags).distinct()
-        if is_favorited is not None and self.request.user.is_authenticated:
+        if is_favorited is not None and user.is_authenticated:
             if is_favorited == '1':
-                queryset = queryset.filter(favorites__user=self.request.user)
+                queryset = queryset.filter(is_favorited=True)
             elif is_favorited == '0':
-                queryset = queryset.exclude(favorites__user=self.request.user)
+                queryset = queryset.filter(is_favorited=False)
 
-        if is_in_shopping_cart is not None and self.request.user.is_authenticated:
+        if is_in_shopping_cart is not None and user.is_authenticated:
             if is_in_shopping_cart == '1':
-                queryset = queryset.filter(shopping_carts__user=self.request.user)
+                queryset = queryset.filter(is_in_shopping_cart=True)
             elif is_in_shopping_cart == '0':
-                queryset = queryset.exclude(shopping_carts__user=self.request.user)
+                queryset = queryset.filter(is_in_shopping_cart=False)
 
         return queryset
 
+    def get_list_validators(self, queryset):
+        aggregates = {}
+        if self.ranking_ordering:
+            # Порядок меняется при каждом пересчете рейтингов.
+            aggregates['ranked'] = Max('ranking__computed_at')
+        values = queryset.order_by().aggregate(
+            updated=Max('updated_at'),
+            author_updated=Max('author__updated_at'),
+            total=Count('id'),
+            **aggregates,
+        )
+        viewer = get_viewer_changed_at(self.request.user)
+        ranked = values.get('ranked')
+        return (
+            (values['updated'], values['author_updated'], values['total'],
+             viewer, ranked),
+            None,
+        )
+
+    def get_object_validators(self, queryset):
+        values = queryset.values_list(
+            'updated_at', 'author__updated_at'
+        ).first()
+        if values is None:
+            return None
+        viewer = get_viewer_changed_at(self.request.user)
+        return (*values, viewer), to_timestamp(*values, viewer)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def perform_destroy(self, instance):
+        with transaction.atomic(), collect_recipe_changes():
+            instance.delete()
+
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -82,83 +185,127 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(instance, data=request.data, partial=partial)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
+        if getattr(instance, '_prefetched_objects_cache', None):
+            instance._prefetched_objects_cache = {}
         return Response(serializer.data)
 
+    @action(
+        detail=False, methods=['get'], filter_backends=[],
+        permission_classes=[permissions.IsAuthenticated]
+    )
+    def feed(self, request):
+        """Рецепты авторов из подписок пользователя, сначала новые."""
+        return self.list(request)
+
     @action(detail=True, methods=['get'], url_path='get-link')
     def get_link(self, request, pk=None):
         recipe = self.get_object()
         short_link = request.build_absolute_uri(f'/s/{recipe.id}/')
         return Response({'short-link': short_link}, status=status.HTTP_200_OK)
 
+    def perform_content_negotiation(self, request, force=False):
+        if self.action == 'download_shopping_cart':
+            # ?format= выбирает формат файла, а не рендерер DRF.
+            renderer = JSONRenderer()
+            return renderer, renderer.media_type
+        return super().perform_content_negotiation(request, force)
+
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def download_shopping_cart(self, request):
-        user = request.user
-        shopping_cart_recipes = user.shopping_carts.all()
-
-        ingredients_list = RecipeIngredient.objects.filter(
-            recipe__shopping_carts__user=user
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(total_amount=Sum('amount'))
-
-        shopping_list = "Список покупок:\n\n"
-        for item in ingredients_list:
-            shopping_list += (
-                f"{item['ingredient__name']} "
-                f"({item['ingredient__measurement_unit']}) - "
-                f"{item['total_amount']}\n"
+        export_format = request.query_params.get('format', 'txt')
+        formats = available_formats()
+        if export_format not in formats:
+            return Response(
+                {'error': f'Неподдерживаемый формат. Доступные: {", ".join(formats)}'},
+                status=status.HTTP_400_BAD_REQUEST
             )
+        fingerprint, updated = cart_fingerprint(request.user)
+        return self.conditional_response(
+            request,
+            ((export_format, fingerprint),
+             to_timestamp(updated, get_viewer_changed_at(request.user))),
+            lambda: shopping_list_response(request.user, export_format, fingerprint)
+        )
 
-        response = HttpResponse(shopping_list, content_type='text/plain')
-        response['Content-Disposition'] = 'attachment; filename=shopping_list.txt'
-        return response
+    def toggle_relation(self, request, pk, model, serializer_class, exists_error, missing_error):
+        """
+        Добавление (POST) или удаление (DELETE) рецепта одним запросом.
+
+        Результат определяется числом затронутых строк, поэтому повторные
+        и одновременные запросы не создают дублей и не ломают счетчики.
+        Одним запросом меняется только строка связи; счетчики, список
+        покупок и метку пользователя обновляют обработчики post_save и
+        post_delete.
+        Рецепт ищется, только если строка не изменилась: 404 или 400.
+        """
+        try:
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise Http404
+        with transaction.atomic():
+            # Пользователь блокируется до записи связи, как в пакетных
+            # add_relations и remove_relations: обработчики сигналов потом
+            # обновляют его строку, и порядок блокировок совпадает.
+            lock_users([request.user.pk])
+            if request.method == 'POST':
+                relation = insert_ignore(
+                    model, require=(Recipe, pk),
+                    user_id=request.user.pk, recipe_id=pk
+                )
+            else:
+                relation = delete_returning(model, user=request.user, recipe=pk)
+        if not relation:
+            get_object_or_404(Recipe.objects.only('pk'), pk=pk)
+            return Response(
+                {'error': exists_error if request.method == 'POST' else missing_error},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if request.method == 'POST':
+            return Response(
+                serializer_class(relation).data.get('recipe'),
+                status=status.HTTP_201_CREATED
+            )
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=['post', 'delete'], permission_classes=[permissions.IsAuthenticated])
     def favorite(self, request, pk=None):
-        recipe = self.get_object()
-        if request.method == 'POST':
-            if Favorite.objects.filter(user=request.user, recipe=recipe).exists():
-                return Response(
-                    {'error': 'Рецепт уже в избранном'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            favorite_obj = Favorite.objects.create(user=request.user, recipe=recipe)
-            
-            minified_serializer = FavoriteSerializer(favorite_obj).data.get('recipe')
-            return Response(minified_serializer, status=status.HTTP_201_CREATED)
-        else:
-            favorite = Favorite.objects.filter(user=request.user, recipe=recipe)
-            if not favorite.exists():
-                return Response(
-                    {'error': 'Рецепт не был в избранном'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            favorite.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+        return self.toggle_relation(
+            request, pk, Favorite, FavoriteSerializer,
+            'Рецепт уже в избранном', 'Рецепт не был в избранном'
+        )
 
     @action(detail=True, methods=['post', 'delete'], permission_classes=[permissions.IsAuthenticated])
     def shopping_cart(self, request, pk=None):
-        recipe = self.get_object()
-        if request.method == 'POST':
-            if ShoppingCart.objects.filter(user=request.user, recipe=recipe).exists():
-                return Response(
-                    {'error': 'Рецепт уже в списке покупок'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            shopping_cart_obj = ShoppingCart.objects.create(user=request.user, recipe=recipe)
-            
-            minified_serializer = ShoppingCartSerializer(shopping_cart_obj).data.get('recipe')
-            return Response(minified_serializer, status=status.HTTP_201_CREATED)
-        else:
-            cart = ShoppingCart.objects.filter(user=request.user, recipe=recipe)
-            if not cart.exists():
-                return Response(
-                    {'error': 'Рецепт не был в списке покупок'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            cart.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+        return self.toggle_relation(
+            request, pk, ShoppingCart, ShoppingCartSerializer,
+            'Рецепт уже в списке покупок', 'Рецепт не был в списке покупок'
+        )
+
+    def change_relations(self, request, model):
+        """Пакетное добавление (POST) или удаление (DELETE) рецептов по списку id."""
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        change = add_relations if request.method == 'POST' else remove_relations
+        results = change(model, request.user, serializer.validated_data['recipes'])
+        return Response({
+            'results': [
+                {'id': pk, 'status': result} for pk, result in results.items()
+            ]
+        })
+
+    @action(
+        detail=False, methods=['post', 'delete'], url_path='favorite/batch',
+        permission_classes=[permissions.IsAuthenticated]
+    )
+    def favorite_batch(self, request):
+        return self.change_relations(request, Favorite)
+
+    @action(
+        detail=False, methods=['post', 'delete'], url_path='shopping_cart/batch',
+        permission_classes=[permissions.IsAuthenticated]
+    )
+    def shopping_cart_batch(self, request):
+        return self.change_relations(request, ShoppingCart)
 
 class FavoriteViewSet(viewsets.ModelViewSet):
     serializer_class = FavoriteSerializer
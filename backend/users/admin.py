@@ -3,7 +3,8 @@ from .models import CustomUser, Follow
 
 @admin.register(CustomUser)
 class CustomUserAdmin(admin.ModelAdmin):
-    list_display = ('username', 'email', 'first_name', 'last_name')
+    list_display = ('username', 'email', 'first_name', 'last_name',
+                    'recipes_count', 'followers_count')
     search_fields = ('email', 'username')
 
 @admin.register(Follow)
@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
-    verbose_name = 'Пользователи' 
\ No newline at end of file
+    verbose_name = 'Пользователи'
+
+    def ready(self):
+        from . import signals  # noqa: F401
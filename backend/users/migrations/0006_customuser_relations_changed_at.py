@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:10
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_customuser_token_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='relations_changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Дата изменения избранного, покупок и подписок'),
+        ),
+    ]
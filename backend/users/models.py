@@ -1,7 +1,10 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 
-class CustomUser(AbstractUser):
+from core.counters import CounterFieldsMixin
+
+class CustomUser(CounterFieldsMixin, AbstractUser):
     email = models.EmailField(
         verbose_name='Электронная почта',
         max_length=254,
@@ -13,6 +16,50 @@ class CustomUser(AbstractUser):
         blank=True,
         null=True,
     )
+    avatar_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии аватара',
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Рецептов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписчиков',
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписок',
+    )
+
+    token_version = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Версия токенов доступа',
+    )
+    relations_changed_at = models.DateTimeField(
+        default=timezone.now,
+        editable=False,
+        verbose_name='Дата изменения избранного, покупок и подписок',
+    )
+
+    # token_version и relations_changed_at меняются только атомарными
+    # UPDATE, как счетчики: сохранение устаревшей копии не должно
+    # отменять отзыв токенов или откатывать метку отношений.
+    counter_fields = (
+        'recipes_count', 'followers_count', 'following_count', 'token_version',
+        'relations_changed_at',
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
@@ -22,6 +69,11 @@ class CustomUser(AbstractUser):
         verbose_name_plural = 'Пользователи'
         ordering = ['id']
 
+    def set_password(self, raw_password):
+        super().set_password(raw_password)
+        # Подписанные токены отзываются после сохранения (users.signals).
+        self._tokens_revoked = True
+
     def __str__(self):
         return f'{self.username} ({self.first_name} {self.last_name})'
 
@@ -2,11 +2,17 @@ from rest_framework import serializers
 from .models import CustomUser, Follow
 from djoser.serializers import UserCreateSerializer, TokenSerializer as DjoserTokenSerializer
 from rest_framework.response import Response
-import base64
-from django.core.files.base import ContentFile
 from django.conf import settings
+from django.db.models import BooleanField, Value
 import logging
+from recipes.loaders import (
+    ViewerStateListSerializer, attach_recipe_previews, get_recipes_limit,
+    get_viewer_state,
+)
 from recipes.serializers import RecipeSubscriptionSerializer
+from core.authentication import issue_signed_token
+from core.fields import Base64ImageField
+from images.fields import ImageVariantsField
 
 logger = logging.getLogger(__name__)
 
@@ -43,20 +49,31 @@ class CustomUserCreateSerializer(UserCreateSerializer):
         return representation
 
 class CustomTokenSerializer(DjoserTokenSerializer):
-    auth_token = serializers.CharField(source='key')
+    auth_token = serializers.SerializerMethodField()
+
+    def get_auth_token(self, token):
+        if settings.AUTH_SIGNED_TOKENS:
+            return issue_signed_token(token.user)
+        return token.key
 
     class Meta(DjoserTokenSerializer.Meta):
         fields = ('auth_token',) 
 
 class CustomUserSerializer(serializers.ModelSerializer):
     avatar = serializers.SerializerMethodField()
+    avatar_variants = ImageVariantsField('avatar')
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
         model = CustomUser
-        fields = ('id', 'email', 'username', 'first_name', 'last_name', 'avatar', 'is_subscribed')
+        fields = ('id', 'email', 'username', 'first_name', 'last_name', 'avatar',
+                  'avatar_variants', 'is_subscribed')
         read_only_fields = ('id', 'email', 'username', 'last_login', 'is_superuser', 
                           'is_staff', 'is_active', 'date_joined', 'groups', 'user_permissions')
+        list_serializer_class = ViewerStateListSerializer
+
+    def prime_viewer_state(self, state, users):
+        state.add_authors(user.pk for user in users)
 
     def get_avatar(self, obj):
         request = self.context.get('request')
@@ -65,10 +82,13 @@ class CustomUserSerializer(serializers.ModelSerializer):
         return None  
 
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return Follow.objects.filter(follower=request.user, leader=obj).exists()
-        return False
+        return get_viewer_state(self.context).is_subscribed(obj)
+
+def subscribed_authors(user):
+    """Авторы, на которых подписан user."""
+    return CustomUser.objects.filter(followers__follower=user).annotate(
+        is_subscribed=Value(True, output_field=BooleanField()),
+    ).order_by('id')
 
 class UserSerializerWithRecipes(CustomUserSerializer):
     recipes = serializers.SerializerMethodField()
@@ -77,20 +97,23 @@ class UserSerializerWithRecipes(CustomUserSerializer):
     class Meta(CustomUserSerializer.Meta):
         fields = CustomUserSerializer.Meta.fields + ('recipes', 'recipes_count')
 
+    def prime_viewer_state(self, state, users):
+        super().prime_viewer_state(state, users)
+        attach_recipe_previews(
+            users, get_recipes_limit(self.context.get('request'))
+        )
+
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        recipes_limit = request.query_params.get('recipes_limit') if request else None
-        queryset = obj.recipes.all().order_by('-created_at')
-        if recipes_limit is not None:
-            try:
-                recipes_limit = int(recipes_limit)
+        queryset = getattr(obj, 'recipe_previews', None)
+        if queryset is None:
+            queryset = obj.recipes.all().order_by('-created_at')
+            recipes_limit = get_recipes_limit(self.context.get('request'))
+            if recipes_limit is not None:
                 queryset = queryset[:recipes_limit]
-            except (ValueError, TypeError):
-                pass
         return RecipeSubscriptionSerializer(queryset, many=True, context=self.context).data
 
     def get_recipes_count(self, obj):
-        return obj.recipes.count()
+        return obj.recipes_count
 
 class FollowSerializer(serializers.ModelSerializer):
     follower = serializers.StringRelatedField(read_only=True)
@@ -112,6 +135,14 @@ class AvatarSerializer(serializers.ModelSerializer):
         model = CustomUser
         fields = ('avatar',)
 
+    def validate_avatar(self, value):
+        if value == 'null':
+            return value
+        if not value.startswith('data:image'):
+            logger.warning("Incorrect data format for avatar")
+            raise serializers.ValidationError("Некорректный формат данных для аватара.")
+        return Base64ImageField(formats=('png', 'jpg')).to_internal_value(value)
+
     def update(self, instance, validated_data):
         logger.info(f"AvatarSerializer update called for user {instance.pk}")
         avatar_data = validated_data.get('avatar')
@@ -131,30 +162,15 @@ class AvatarSerializer(serializers.ModelSerializer):
                          raise serializers.ValidationError(f"Ошибка при удалении аватара: {e}")
                  else:
                      logger.info("No avatar to delete.")
-            elif isinstance(avatar_data, str) and avatar_data.startswith('data:image'):
-                logger.info("Avatar data is base64 string, attempting to save.")
-                if instance.avatar:
-                    
-                    try:
-                         instance.avatar.delete(save=False)
-                         logger.info("Old avatar deleted before saving new one.")
-                    except Exception as e:
-                         logger.warning(f"Could not delete old avatar: {e}")
-
+            else:
+                logger.info("Avatar data is decoded image, attempting to save.")
+                # Прежний файл не удаляется: хранилище адресует файлы по
+                # содержимому, и неиспользуемые удаляет сборщик мусора.
                 try:
-                    format, imgstr = avatar_data.split(';base64,')
-                    ext = format.split('/')[-1]
-                    if ext.lower() not in ['png', 'jpg', 'jpeg']:
-                         logger.warning(f"Unsupported image format: {ext}")
-                         raise serializers.ValidationError("Неподдерживаемый формат изображения.")
-                    file_name = f"avatar_{instance.pk}.{ext.lower()}"
-                    instance.avatar.save(file_name, ContentFile(base64.b64decode(imgstr)), save=True)
-                    logger.info(f"New avatar saved successfully: {file_name}")
+                    instance.avatar.save(avatar_data.name, avatar_data, save=True)
+                    logger.info(f"New avatar saved successfully: {instance.avatar.name}")
                 except Exception as e:
-                    logger.error(f"Error processing base64 or saving file: {e}", exc_info=True)
-                    raise serializers.ValidationError(f"Ошибка при обработке base64 или сохранении файла: {e}")
-            else:
-                 logger.warning(f"Incorrect data format for avatar: {type(avatar_data)}")
-                 raise serializers.ValidationError("Некорректный формат данных для аватара.")
+                    logger.error(f"Error saving file: {e}", exc_info=True)
+                    raise serializers.ValidationError(f"Ошибка при сохранении файла: {e}")
 
         return instance
\ No newline at end of file
@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from core.authentication import forget_signed_user, token_cache
+from core.counters import adjust_counters
+from core.versions import mark_viewer_changed
+from .models import CustomUser, Follow
+
+
+def revoke_signed_tokens(user_id):
+    """Отзывает подписанные токены пользователя увеличением версии."""
+    adjust_counters(CustomUser, user_id, token_version=1)
+    forget_signed_user(user_id)
+
+
+@receiver([post_save, post_delete], sender=CustomUser)
+def user_credentials_changed(sender, instance, signal, **kwargs):
+    # Любое сохранение: смена пароля, деактивация, изменение профиля.
+    token_cache.invalidate_user(
+        instance.pk,
+        Token.objects.filter(user_id=instance.pk).values_list('key', flat=True)
+    )
+    if signal is post_save and instance.__dict__.pop('_tokens_revoked', False):
+        revoke_signed_tokens(instance.pk)
+    else:
+        forget_signed_user(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    token_cache.invalidate([instance.key])
+
+
+@receiver(user_logged_out)
+def user_logged_out_handler(sender, user=None, **kwargs):
+    if user is None:
+        return
+    token_cache.invalidate_user(user.pk)
+    if settings.AUTH_SIGNED_TOKENS:
+        # Выход завершает все сессии пользователя, как удаление ключа.
+        revoke_signed_tokens(user.pk)
+
+
+@receiver([post_save, post_delete], sender=Follow)
+def follow_changed(sender, instance, **kwargs):
+    mark_viewer_changed(instance.follower_id)
+
+
+@receiver([post_save, post_delete], sender=Follow)
+def follow_counted(sender, instance, signal, created=False, **kwargs):
+    if signal is not post_delete and not created:
+        return
+    delta = 1 if created else -1
+    # Строки обновляются по возрастанию id, чтобы встречные подписки
+    # не блокировали друг друга.
+    for pk, field in sorted([
+        (instance.leader_id, 'followers_count'),
+        (instance.follower_id, 'following_count'),
+    ]):
+        adjust_counters(CustomUser, pk, **{field: delta})
@@ -1,19 +1,25 @@
 from rest_framework import viewsets, permissions, filters, status
 from .models import CustomUser, Follow
-from .serializers import CustomUserSerializer, FollowSerializer, ChangePasswordSerializer, AvatarSerializer, CustomUserCreateSerializer, UserSerializerWithRecipes
+from .serializers import CustomUserSerializer, FollowSerializer, ChangePasswordSerializer, AvatarSerializer, CustomUserCreateSerializer, UserSerializerWithRecipes, subscribed_authors
 from .permissions import IsOwnerOrReadOnly
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.permissions import AllowAny
+from django.http import Http404
 from django.shortcuts import get_object_or_404
-from django.db import IntegrityError
+from django.db import transaction
+from django.db.models import Max, Count
+from core.conditional import ConditionalGetMixin, to_timestamp
+from core.statements import delete_returning, insert_ignore
 from core.pagination import CustomPagination
+from core.versions import get_viewer_changed_at
+from recipes.models import Recipe
 import logging
 
 logger = logging.getLogger(__name__)
 
-class CustomUserViewSet(viewsets.ModelViewSet):
+class CustomUserViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = CustomUser.objects.all()
     serializer_class = CustomUserSerializer
     filter_backends = [filters.SearchFilter]
@@ -35,6 +41,34 @@ class CustomUserViewSet(viewsets.ModelViewSet):
             return UserSerializerWithRecipes
         return super().get_serializer_class()
 
+    def get_list_validators(self, queryset):
+        values = queryset.order_by().aggregate(
+            updated=Max('updated_at'), total=Count('id')
+        )
+        viewer = get_viewer_changed_at(self.request.user)
+        return (values['updated'], values['total'], viewer), None
+
+    def get_object_validators(self, queryset):
+        updated = queryset.values_list('updated_at', flat=True).first()
+        if updated is None:
+            return None
+        viewer = get_viewer_changed_at(self.request.user)
+        return (updated, viewer), to_timestamp(updated, viewer)
+
+    def get_subscriptions_validators(self, user):
+        authors = CustomUser.objects.filter(followers__follower=user).aggregate(
+            updated=Max('updated_at'), total=Count('id')
+        )
+        recipes = Recipe.objects.filter(
+            author__followers__follower=user
+        ).aggregate(updated=Max('updated_at'), total=Count('id'))
+        viewer = get_viewer_changed_at(self.request.user)
+        return (
+            (authors['updated'], authors['total'], recipes['updated'],
+             recipes['total'], viewer),
+            None,
+        )
+
     def create(self, request, *args, **kwargs):
         
         email = request.data.get('email')
@@ -79,8 +113,14 @@ class CustomUserViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated], url_path='me')
     def me(self, request):
-        serializer = self.get_serializer(request.user)
-        return Response(serializer.data)
+        # request.user может быть из кэша аутентификации и отставать от
+        # базы на TOKEN_CACHE_TTL: валидаторы и ответ берутся из базы.
+        queryset = CustomUser.objects.filter(pk=request.user.pk)
+        return self.conditional_response(
+            request,
+            self.get_object_validators(queryset),
+            lambda: Response(self.get_serializer(queryset.get()).data)
+        )
 
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def get_avatar(self, request):
@@ -105,60 +145,49 @@ class CustomUserViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post', 'delete'], permission_classes=[permissions.IsAuthenticated])
     def subscribe(self, request, pk=None):
-        leader = get_object_or_404(CustomUser, pk=pk)
+        # Подписка и отписка — один INSERT/DELETE; ответ по числу строк.
+        try:
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise Http404
         user = request.user
 
-        if user == leader:
+        if user.pk == pk:
             return Response(
                 {'errors': 'Нельзя подписаться на самого себя.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        if request.method == 'POST':
-            try:
-                Follow.objects.create(follower=user, leader=leader)
-                serializer = UserSerializerWithRecipes(leader, context={'request': request})
-                return Response(serializer.data, status=status.HTTP_201_CREATED)
-            except IntegrityError:
-                return Response(
-                    {'errors': 'Вы уже подписаны на этого пользователя.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            except Exception as e:
-                logger.error(f"Error in subscribe POST: {e}", exc_info=True)
-                return Response(
-                    {'errors': 'Произошла внутренняя ошибка сервера.'},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
-
-        elif request.method == 'DELETE':
-            try:
-                follow_instance = Follow.objects.filter(follower=user, leader=leader)
-                if follow_instance.exists():
-                    follow_instance.delete()
-                    return Response(status=status.HTTP_204_NO_CONTENT)
-                else:
-                    return Response(
-                        {'errors': 'Вы не подписаны на этого пользователя.'},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-            except Exception as e:
-                logger.error(f"Error in subscribe DELETE: {e}", exc_info=True)
-                return Response(
-                    {'errors': 'Произошла внутренняя ошибка сервера.'},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        with transaction.atomic():
+            if request.method == 'POST':
+                changed = insert_ignore(
+                    Follow, require=(CustomUser, pk),
+                    follower_id=user.pk, leader_id=pk
                 )
+            else:
+                changed = delete_returning(Follow, follower=user, leader=pk)
+        if changed and request.method == 'DELETE':
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        leader = get_object_or_404(CustomUser, pk=pk)
+        if not changed:
+            return Response(
+                {'errors': 'Вы уже подписаны на этого пользователя.'
+                 if request.method == 'POST'
+                 else 'Вы не подписаны на этого пользователя.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = UserSerializerWithRecipes(leader, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def subscriptions(self, request):
         try:
             user = request.user
-            followed_users = CustomUser.objects.filter(followers__follower=user)
-
-            page = self.paginate_queryset(followed_users)
-            
-            serializer = UserSerializerWithRecipes(page, many=True, context={'request': request})
-            return self.get_paginated_response(serializer.data)
+            return self.conditional_response(
+                request,
+                self.get_subscriptions_validators(user),
+                lambda: self.list_subscriptions(request)
+            )
         except Exception as e:
             logger.error(f"Error in subscriptions GET: {e}", exc_info=True)
             return Response(
@@ -166,6 +195,14 @@ class CustomUserViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def list_subscriptions(self, request):
+        followed_users = subscribed_authors(request.user)
+
+        page = self.paginate_queryset(followed_users)
+
+        serializer = UserSerializerWithRecipes(page, many=True, context={'request': request})
+        return self.get_paginated_response(serializer.data)
+
 class FollowViewSet(viewsets.ModelViewSet):
     queryset = Follow.objects.all()
     serializer_class = FollowSerializer